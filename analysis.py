@@ -0,0 +1,181 @@
+"""
+Persistent analysis cache
+
+Remembers the result of every root search (depth, score, best move and the seconds the search took) in an
+SQLite file, so a position searched in an earlier game or by another engine process is answered at once.
+Positions are keyed by the Zobrist key of this engine (board.key), stored as a signed 64-bit integer.
+A cached result is used when it was searched at least as deep as asked for; a deeper search of the same
+position replaces it, a shallower one does not.
+
+The file is in write-ahead logging mode, so any number of processes can read it while one of them writes,
+and writers wait for each other. Every hit marks its entry as used; once the cache holds more than its
+maximum number of entries the least recently used ones are deleted. The number of entries is kept in the file
+by triggers, so every store can check it without counting the table.
+
+    python runner.py --cache analysis.db
+    python analysis.py info analysis.db
+"""
+from game import EMPTY, legal_actions, move_id
+from point import Point
+import argparse
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    key INTEGER PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    move INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_used ON analysis (used);
+CREATE TABLE IF NOT EXISTS analysis_count (entries INTEGER NOT NULL);
+INSERT INTO analysis_count SELECT COUNT(*) FROM analysis WHERE NOT EXISTS (SELECT 1 FROM analysis_count);
+CREATE TRIGGER IF NOT EXISTS analysis_insert AFTER INSERT ON analysis BEGIN
+    UPDATE analysis_count SET entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS analysis_delete AFTER DELETE ON analysis BEGIN
+    UPDATE analysis_count SET entries = entries - 1;
+END;
+"""
+# Seconds a process waits for another one to finish writing
+BUSY_TIMEOUT = 30.0
+
+
+def signed(key):
+    """
+    Returns the 64-bit Zobrist key as the signed integer SQLite stores
+    """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class AnalysisCache:
+    def __init__(self, path, max_entries=100000):
+        """
+        Opens the cache file, creating it if needed
+        max_entries: entries kept, the least recently used ones are deleted beyond it
+        """
+        self.path = path
+        self.max_entries = max_entries
+        # Autocommit: every statement is its own transaction unless a BEGIN opens one
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        # In one transaction, so no process writes entries between the count and its triggers
+        self.db.executescript('BEGIN IMMEDIATE;' + SCHEMA + 'COMMIT;')
+        self.probes = 0
+        self.hits = 0
+        self.shallow = 0
+        self.stores = 0
+        self.evicted = 0
+        # Search time of the cached results returned, and time spent probing
+        self.saved = 0.0
+        self.probe_seconds = 0.0
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT entries FROM analysis_count').fetchone()[0]
+
+    def lookup(self, board, depth):
+        """
+        Returns (piece, move, score, depth) of the cached search of the board for the side to move,
+        None if there is none at least depth plies deep or its move can not be played on the board
+        """
+        start = time.perf_counter()
+        self.probes += 1
+        try:
+            key = signed(board.key)
+            row = self.db.execute('SELECT depth, score, move, seconds FROM analysis WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            cached_depth, score, move, seconds = row
+            if cached_depth < depth:
+                self.shallow += 1
+                return None
+            frm, to = divmod(move, 64)
+            piece = board[frm // 8][frm % 8]
+            mv = Point(to // 8, to % 8)
+            if piece == EMPTY or piece.color != board.turn or mv not in legal_actions(board, piece):
+                # A different position with the same key
+                return None
+            self.db.execute('UPDATE analysis SET used = ? WHERE key = ?', (time.time(), key))
+            self.hits += 1
+            self.saved += seconds
+            return piece, mv, score, cached_depth
+        finally:
+            self.probe_seconds += time.perf_counter() - start
+
+    def store(self, board, piece, mv, score, depth, seconds):
+        """
+        Stores the result of a search of the board taking seconds, unless the cache holds a deeper one.
+        Deletes the least recently used entries beyond max_entries.
+        """
+        if piece is None or depth <= 0:
+            return
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = self.db.execute(
+                'INSERT INTO analysis (key, depth, score, move, seconds, used) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET depth = excluded.depth, score = excluded.score, move = excluded.move, '
+                'seconds = excluded.seconds, used = excluded.used WHERE excluded.depth >= analysis.depth',
+                (signed(board.key), depth, score, move_id(piece, mv), seconds, time.time()))
+            self.stores += cursor.rowcount
+            self.evicted += self.trim()
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def trim(self):
+        """
+        Deletes the least recently used entries beyond max_entries. Returns the number of entries deleted.
+        """
+        excess = len(self) - self.max_entries
+        if excess <= 0:
+            return 0
+        return self.db.execute('DELETE FROM analysis WHERE key IN (SELECT key FROM analysis ORDER BY used LIMIT ?)',
+                               (excess,)).rowcount
+
+    def report(self):
+        """
+        Returns the hit rate, the search time saved and the probe cost as a printable string
+        """
+        probes = max(self.probes, 1)
+        return (f"Cache: {self.probes} probes, hits {100 * self.hits / probes:.1f}%, "
+                f"too shallow {100 * self.shallow / probes:.1f}%, {self.saved:.1f}s of search saved, "
+                f"{1000 * self.probe_seconds / probes:.2f}ms per probe, {self.stores} stores, {self.evicted} evicted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or trim a persistent analysis cache")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info_parser = commands.add_parser('info', help="print the number of entries per depth and the search time they hold")
+    info_parser.add_argument('path')
+    trim_parser = commands.add_parser('trim', help="delete the least recently used entries")
+    trim_parser.add_argument('path')
+    trim_parser.add_argument('--max-entries', type=int, required=True)
+    args = parser.parse_args()
+
+    with AnalysisCache(args.path) as cache:
+        if args.command == 'trim':
+            cache.max_entries = args.max_entries
+            print(f"{cache.trim()} entries deleted, {len(cache)} left")
+            return
+        rows = cache.db.execute('SELECT depth, COUNT(*), SUM(seconds) FROM analysis GROUP BY depth ORDER BY depth').fetchall()
+        for depth, count, seconds in rows:
+            print(f"depth {depth:>2}: {count:>8} entries, {seconds:10.1f}s of search")
+        print(f"{len(cache)} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Batch position analysis
+
+Reads positions from a FEN or EPD file (one per line), searches each of them on a pool of worker processes
+and writes one JSON object per position to the output file, in input order:
+
+    {"n": 1, "id": "pos1", "fen": "...", "move": "e2e4", "score": 7, "depth": 5, "nodes": 14613, "seconds": 0.49}
+
+The input is streamed and only a bounded number of positions is in flight, so memory stays flat for any input size.
+Results are flushed as they are written; running the same command again skips the positions already in the
+output file, so an interrupted run resumes where it stopped.
+With --cache the workers share a persistent analysis cache (see analysis.py): positions it holds at the
+requested depth are answered from it ("cached": true) and new searches are added to it.
+
+    python batch.py positions.epd results.jsonl --depth 5 --workers 8 --cache analysis.db
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from notation import board_from_fen, square_name
+from runner import SearchContext, iterative_deepening
+from transposition import TranspositionTable
+from analysis import AnalysisCache
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Transposition table and analysis cache of the worker process, set up by _init_worker
+_tt = None
+_cache = None
+
+
+def _init_worker(hash_mb, cache_path=None):
+    global _tt, _cache
+    _tt = TranspositionTable(hash_mb) if hash_mb > 0 else None
+    _cache = AnalysisCache(cache_path) if cache_path else None
+
+
+def read_positions(path):
+    """
+    Yields (number, id, fen) for every position in a FEN or EPD file, skipping blank lines and # comments.
+    EPD lines hold the first four FEN fields followed by operations; the id operation names the position.
+    """
+    number = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            number += 1
+            fields = line.split(None, 4)
+            fen = ' '.join(fields[:4])
+            operations = fields[4] if len(fields) > 4 else ''
+            position_id = None
+            for operation in operations.split(';'):
+                operation = operation.strip()
+                if operation.startswith('id '):
+                    position_id = operation[3:].strip().strip('"')
+            yield number, position_id, fen
+
+
+def analyze(number, position_id, fen, depth, movetime, max_nodes):
+    """
+    Searches one position in a worker process and returns its result record
+    """
+    record = {'n': number, 'id': position_id, 'fen': fen}
+    try:
+        board = board_from_fen(fen)
+    except ValueError as e:
+        record['error'] = str(e)
+        return record
+    start = time.monotonic()
+    cached = _cache.lookup(board, depth) if _cache is not None else None
+    if cached:
+        piece, mv, value, reached = cached
+        record['cached'] = True
+        nodes = 0
+    else:
+        if _tt is not None:
+            _tt.new_search()
+        ctx = SearchContext(tt=_tt)
+        piece, mv, value, reached = iterative_deepening(board, board.turn, movetime, max_nodes, depth, ctx)
+        nodes = ctx.nodes
+        if _cache is not None:
+            _cache.store(board, piece, mv, value, reached, time.monotonic() - start)
+    record['move'] = square_name(piece.pos.x, piece.pos.y) + square_name(mv.x, mv.y) if piece is not None else None
+    record['score'] = value
+    record['depth'] = reached
+    record['nodes'] = nodes
+    record['seconds'] = round(time.monotonic() - start, 4)
+    return record
+
+
+def completed(path):
+    """
+    Returns the number of results already in the output file.
+    A last line cut off by an interrupted run is removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    good = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            count += 1
+            good += len(line)
+    if good != os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+    return count
+
+
+def run(input_path, output_path, depth=4, movetime=None, max_nodes=None, workers=None, hash_mb=16, resume=True,
+        cache_path=None):
+    """
+    Analyzes every position of input_path into output_path.
+    Returns (positions analyzed, positions of them answered from the analysis cache).
+    """
+    workers = workers or multiprocessing.cpu_count()
+    skip = completed(output_path) if resume else 0
+    mode = 'a' if resume else 'w'
+    analyzed = 0
+    cached = 0
+    if cache_path:
+        # Create the cache file before the workers open it at once
+        AnalysisCache(cache_path).close()
+
+    def write(record):
+        nonlocal analyzed, cached
+        out.write(json.dumps(record) + '\n')
+        out.flush()
+        analyzed += 1
+        cached += record.get('cached', False)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(hash_mb, cache_path)) as pool, \
+            open(output_path, mode) as out:
+        pending = deque()
+        try:
+            for number, position_id, fen in read_positions(input_path):
+                if number <= skip:
+                    continue
+                pending.append(pool.submit(analyze, number, position_id, fen, depth, movetime, max_nodes))
+                # Keep a few positions per worker queued, write the oldest when the window is full
+                while len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            raise
+    return analyzed, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the positions of a FEN/EPD file into JSON lines")
+    parser.add_argument('input', help="FEN or EPD file, one position per line")
+    parser.add_argument('output', help="JSON lines file, appended to when resuming")
+    parser.add_argument('--depth', type=int, default=4, help="maximum search depth")
+    parser.add_argument('--movetime', type=float, default=None, metavar='SECONDS', help="time budget per position")
+    parser.add_argument('--nodes', type=int, default=None, help="node budget per position")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table size per worker")
+    parser.add_argument('--restart', action='store_true', help="overwrite the output instead of resuming")
+    parser.add_argument('--cache', metavar='FILE', help="analysis cache shared by the workers and kept between runs")
+    args = parser.parse_args()
+    start = time.monotonic()
+    try:
+        count, cached = run(args.input, args.output, args.depth, args.movetime, args.nodes, args.workers, args.hash,
+                            not args.restart, args.cache)
+    except KeyboardInterrupt:
+        print("Interrupted, run the same command again to resume", file=sys.stderr)
+        sys.exit(130)
+    hits = f", {cached} from the cache ({100 * cached / max(count, 1):.1f}%)" if args.cache else ''
+    print(f"{count} positions analyzed{hits} in {time.monotonic() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Search benchmark
+
+Searches positions from seeded random games to a fixed depth with several search configurations and
+compares their node counts, times, effective branching factors, best moves and scores with plain alpha-beta.
+With --movetime every search gets the same time instead, to compare the depth each configuration reaches. By default each search
+gets its own 16 MB transposition table, as in play, and scores may differ slightly; with --hash 0 the searches run without a
+table, so the same depth gives the same score in every configuration without reductions.
+
+    python bench.py --depth 5
+    python bench.py --movetime 2
+"""
+from game import game_init, make_move, game_over, WHITE, all_available_black_moves, all_available_white_moves
+from runner import SearchContext, iterative_deepening
+from stats import SearchStats
+from transposition import TranspositionTable
+import argparse
+import random
+import time
+
+# Name and SearchContext options of every configuration, plain alpha-beta first
+CONFIGURATIONS = (
+    ('alpha-beta', {'pvs': False, 'aspiration': False, 'null_move': False, 'lmr': False}),
+    ('pvs', {'pvs': True, 'aspiration': False, 'null_move': False, 'lmr': False}),
+    ('pvs + aspiration', {'pvs': True, 'aspiration': True, 'null_move': False, 'lmr': False}),
+    ('+ null move', {'pvs': True, 'aspiration': True, 'null_move': True, 'lmr': False}),
+    ('+ lmr', {'pvs': True, 'aspiration': True, 'null_move': False, 'lmr': True}),
+    ('+ null move + lmr', {'pvs': True, 'aspiration': True, 'null_move': True, 'lmr': True}),
+)
+
+
+def positions(count, seed=7):
+    """
+    Returns count boards reached by random moves from the start position
+    """
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = game_init(WHITE)[0]
+        for _ in range(8 + 4 * len(boards)):
+            moves = all_available_white_moves(board) if board.turn == WHITE else all_available_black_moves(board)
+            choices = [(piece, mv) for piece, mvs in moves for mv in mvs]
+            if not choices:
+                break
+            make_move(board, *rng.choice(choices))
+        if not game_over(board):
+            boards.append(board)
+    return boards
+
+
+def run(boards, depth=64, movetime=None, configurations=CONFIGURATIONS, hash_mb=0):
+    """
+    Searches every board with every configuration to depth, or for movetime seconds.
+    Returns {name: (nodes, seconds, number of positions with the best move and score of the first configuration,
+    mean depth reached, mean effective branching factor)}
+    """
+    totals = {name: [0, 0.0, 0, 0, []] for name, _ in configurations}
+    for board in boards:
+        reference = None
+        for name, options in configurations:
+            ctx = SearchContext(tt=TranspositionTable(hash_mb) if hash_mb > 0 else None, **options)
+            stats = SearchStats()
+            start = time.perf_counter()
+            piece, mv, value, reached = iterative_deepening(
+                board, board.turn, movetime, None, depth, ctx,
+                on_iteration=lambda depth, piece, mv, value, nodes, seconds: stats.iteration(depth, nodes, seconds, value))
+            total = totals[name]
+            total[0] += ctx.nodes
+            total[1] += time.perf_counter() - start
+            if reference is None:
+                reference = (piece, mv, value)
+            total[2] += (piece, mv, value) == reference
+            total[3] += reached
+            if stats.effective_branching_factor() is not None:
+                total[4].append(stats.effective_branching_factor())
+    return {name: (nodes, seconds, same, reached / len(boards), sum(factors) / len(factors) if factors else 0)
+            for name, (nodes, seconds, same, reached, factors) in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the search configurations at a fixed depth or time")
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--movetime', type=float, default=None, metavar='SECONDS',
+                        help="search every position for this long instead, to compare the depth reached")
+    parser.add_argument('--positions', type=int, default=8)
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table of every search (0 for none)")
+    args = parser.parse_args()
+    boards = positions(args.positions)
+    depth = 64 if args.movetime else args.depth
+    totals = run(boards, depth, args.movetime, hash_mb=args.hash)
+    base_nodes = totals[CONFIGURATIONS[0][0]][0]
+    limit = f"{args.movetime}s per position" if args.movetime else f"depth {args.depth}"
+    print(f"{len(boards)} positions, {limit}, {args.hash} MB transposition table")
+    for name, (nodes, seconds, same, reached, factor) in totals.items():
+        print(f"{name:<20} {nodes:>10} nodes ({100 * nodes / base_nodes:5.1f}%) {seconds:7.2f}s "
+              f"{nodes / max(seconds, 1e-9):7.0f} nodes/s  depth {reached:4.1f}  EBF {factor:4.2f}  "
+              f"same move and score: {same}/{len(boards)}")
+
+
+if __name__ == "__main__":
+    main()
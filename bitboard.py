@@ -0,0 +1,601 @@
+"""
+Bitboard engine backend
+
+The position is stored as one 64-bit integer per piece type and color, where bit
+(x * 8 + y) is set when a piece stands on row x and column y of the 8 * 8 board.
+The module exposes the same functions as game.py that minimize/maximize need
+(terminal, evaluation, all_available_black_moves, all_available_white_moves, staged_moves, legal_move, in_check,
+make_move, unmake_move, make_null_move, unmake_null_move, move_id, move_from_id, capture, material), so it can be passed to them as the search backend:
+
+    pos = BitBoard.from_board(board)
+    frm, to, value = minimize(pos, 3, -math.inf, math.inf, SearchContext(bitboard))
+
+Moves are (from square, to square) integers instead of Piece and Point objects.
+Play with it with python runner.py --backend bitboard. It generates moves about 1.5 times as fast as game.py
+(perft.py --backend bitboard), but the search spends most of its time outside the move generator, so it only
+searches about 1.2 times as many nodes per second.
+"""
+from game import BLACK, WHITE, EMPTY, ALL_MOVES, CAPTURES, QUIET_MOVES, Points, ZOBRIST, ZOBRIST_BLACK_TO_MOVE, MIDDLEGAME, ENDGAME, PHASE, blend
+from point import Point
+import game
+
+FULL = (1 << 64) - 1
+NAMES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+
+# Column masks, used to stop pawn captures from wrapping around the board
+COLUMN_0 = sum(1 << (x * 8) for x in range(8))
+COLUMN_7 = COLUMN_0 << 7
+
+
+def _jumps(steps):
+    """
+    Returns the table of target masks for a jumping piece, one entry per square
+    """
+    table = []
+    for x in range(8):
+        for y in range(8):
+            mask = 0
+            for dx, dy in steps:
+                if 0 <= x + dx <= 7 and 0 <= y + dy <= 7:
+                    mask |= 1 << ((x + dx) * 8 + y + dy)
+            table.append(mask)
+    return table
+
+
+def _ray(x, y, dx, dy):
+    """
+    Returns the mask of all the squares from (x, y) towards (dx, dy), excluding (x, y)
+    """
+    mask = 0
+    x += dx
+    y += dy
+    while 0 <= x <= 7 and 0 <= y <= 7:
+        mask |= 1 << (x * 8 + y)
+        x += dx
+        y += dy
+    return mask
+
+
+KNIGHT_ATTACKS = _jumps(((1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)))
+KING_ATTACKS = _jumps(((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)))
+# Squares a pawn of each color attacks from every square: black pawns capture towards higher rows
+PAWN_ATTACKS = {BLACK: _jumps(((1, 1), (1, -1))), WHITE: _jumps(((-1, 1), (-1, -1)))}
+
+# Ray masks per direction and square. Directions with a positive step run towards
+# higher square numbers, so their nearest blocker is the lowest set bit.
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+RAYS = {d: [_ray(x, y, *d) for x in range(8) for y in range(8)] for d in DIRECTIONS}
+POSITIVE = {d: d[0] * 8 + d[1] > 0 for d in DIRECTIONS}
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+# (ray masks by square, positive) of the directions of each slider, as slide walks them
+ROOK_SLIDES = tuple((RAYS[d], POSITIVE[d]) for d in ROOK_DIRECTIONS)
+BISHOP_SLIDES = tuple((RAYS[d], POSITIVE[d]) for d in BISHOP_DIRECTIONS)
+QUEEN_SLIDES = ROOK_SLIDES + BISHOP_SLIDES
+
+
+def nearest(d, mask):
+    """
+    Returns the square of mask nearest to the start of a ray in direction d
+    """
+    return (mask & -mask).bit_length() - 1 if POSITIVE[d] else mask.bit_length() - 1
+
+
+def slide(sq, slides, occupied):
+    """
+    Returns the mask of squares a slider on sq reaches along the rays of slides (ROOK_SLIDES, BISHOP_SLIDES
+    or QUEEN_SLIDES), up to and including the first occupied square of each ray
+    """
+    attacks = 0
+    for rays, positive in slides:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1 if positive else blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def _relevant(slides):
+    """
+    Returns the mask of the squares which can block a slider along slides, one per square: its rays without
+    the last square of each, as a piece there stops nothing
+    """
+    masks = []
+    for sq in range(64):
+        mask = 0
+        for rays, positive in slides:
+            ray = rays[sq]
+            if ray:
+                mask |= ray & ~(1 << (ray.bit_length() - 1) if positive else ray & -ray)
+        masks.append(mask)
+    return masks
+
+
+# Attack masks of the sliders per square by the blockers on their relevant squares, filled in as positions
+# are met: a rook has at most 4096 blocker sets per square and a bishop 512, so a lookup replaces the ray walk
+ROOK_BLOCKERS = _relevant(ROOK_SLIDES)
+BISHOP_BLOCKERS = _relevant(BISHOP_SLIDES)
+# Squares a rook and a bishop reach from each square on an empty board
+ROOK_LINES = [slide(sq, ROOK_SLIDES, 0) for sq in range(64)]
+BISHOP_LINES = [slide(sq, BISHOP_SLIDES, 0) for sq in range(64)]
+ROOK_ATTACKS = [{} for _ in range(64)]
+BISHOP_ATTACKS = [{} for _ in range(64)]
+
+
+def rook_attacks(sq, occupied):
+    """
+    Returns the mask of squares a rook on sq reaches, up to and including the first occupied square of each ray
+    """
+    blockers = occupied & ROOK_BLOCKERS[sq]
+    attacks = ROOK_ATTACKS[sq].get(blockers)
+    if attacks is None:
+        attacks = ROOK_ATTACKS[sq][blockers] = slide(sq, ROOK_SLIDES, blockers)
+    return attacks
+
+
+def bishop_attacks(sq, occupied):
+    """
+    Returns the mask of squares a bishop on sq reaches, up to and including the first occupied square of each ray
+    """
+    blockers = occupied & BISHOP_BLOCKERS[sq]
+    attacks = BISHOP_ATTACKS[sq].get(blockers)
+    if attacks is None:
+        attacks = BISHOP_ATTACKS[sq][blockers] = slide(sq, BISHOP_SLIDES, blockers)
+    return attacks
+
+
+def squares(mask):
+    """
+    Yields the square numbers of the set bits in mask, lowest first
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def bits(mask):
+    """
+    Returns the list of the square numbers of the set bits in mask, lowest first
+    """
+    found = []
+    while mask:
+        low = mask & -mask
+        found.append(low.bit_length() - 1)
+        mask ^= low
+    return found
+
+
+def square(point):
+    """
+    Converts Point class object to square number
+    """
+    return point.x * 8 + point.y
+
+
+def point(sq):
+    """
+    Converts square number to Point class object
+    """
+    return Point(sq >> 3, sq & 7)
+
+
+class BitBoard:
+    def __init__(self):
+        # pieces[color][name] is the mask of the squares holding that piece
+        self.pieces = {BLACK: dict.fromkeys(NAMES, 0), WHITE: dict.fromkeys(NAMES, 0)}
+        self.occupied = {BLACK: 0, WHITE: 0}
+        # (color, name) for every square, None if empty
+        self.squares = [None] * 64
+        # Pawns which have not moved yet (Piece.init is False)
+        self.unmoved = 0
+        # Score terms as in game.Board, kept up to date by put and remove
+        self.mg = 0
+        self.eg = 0
+        self.phase = 0
+        self.turn = WHITE
+        # Zobrist key, the same as game.Board.key for the same position
+        self.key = 0
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Builds the bitboard position from 8 * 8 board of Piece objects
+        """
+        pos = cls()
+        if board.turn == BLACK:
+            pos.turn = BLACK
+            pos.key ^= ZOBRIST_BLACK_TO_MOVE
+        for i in range(8):
+            for j in range(8):
+                piece = board[i][j]
+                if piece != EMPTY:
+                    pos.put(i * 8 + j, piece.color, piece.name)
+                    if piece.name == 'Pawn' and not piece.init:
+                        pos.unmoved |= 1 << (i * 8 + j)
+        return pos
+
+    def put(self, sq, color, name):
+        bit = 1 << sq
+        self.pieces[color][name] |= bit
+        self.occupied[color] |= bit
+        self.squares[sq] = (color, name)
+        self.mg += MIDDLEGAME[color][name][sq]
+        self.eg += ENDGAME[color][name][sq]
+        self.phase += PHASE[name]
+        self.key ^= ZOBRIST[color][name][sq]
+
+    def remove(self, sq):
+        color, name = self.squares[sq]
+        bit = ~(1 << sq)
+        self.pieces[color][name] &= bit
+        self.occupied[color] &= bit
+        self.squares[sq] = None
+        self.mg -= MIDDLEGAME[color][name][sq]
+        self.eg -= ENDGAME[color][name][sq]
+        self.phase -= PHASE[name]
+        self.key ^= ZOBRIST[color][name][sq]
+
+    def moves(self, color, stage=ALL_MOVES, checks=None):
+        """
+        Returns available moves for all pieces of color as list of tuples,
+        where each tuple contains the from square and the list of target squares.
+        stage: ALL_MOVES, CAPTURES or QUIET_MOVES, the moves returned
+        checks: checks_and_pins(color) when it is already known
+        """
+        return [(sq, bits(mask)) for sq, mask in self.targets(color, stage, checks).items() if mask]
+
+    def targets(self, color, stage=ALL_MOVES, checks=None):
+        """
+        Returns {from square: mask of the target squares} of the legal moves of stage of every piece of color,
+        the mask 0 for a piece without such moves
+        checks: checks_and_pins(color) when it is already known
+        """
+        enemy = WHITE if color == BLACK else BLACK
+        own = self.occupied[color]
+        foe = self.occupied[enemy]
+        occupied = own | foe
+        empty = ~occupied & FULL
+        allowed_targets = foe if stage == CAPTURES else empty if stage == QUIET_MOVES else FULL
+        pieces = self.pieces[color]
+        targets = {}
+
+        # Pawns are generated set-wise with shifts, then grouped by the pawn that moves
+        pawns = pieces['Pawn']
+        if pawns:
+            if color == BLACK:
+                step = 8
+                single = (pawns << 8) & empty
+                double = ((((pawns & self.unmoved) << 8) & empty) << 8) & empty
+                right = ((pawns & ~COLUMN_7) << 9) & foe
+                left = ((pawns & ~COLUMN_0) << 7) & foe
+                shifted = ((double, 2 * step), (single, step), (right, 9), (left, 7))
+            else:
+                step = -8
+                single = (pawns >> 8) & empty
+                double = ((((pawns & self.unmoved) >> 8) & empty) >> 8) & empty
+                right = ((pawns & ~COLUMN_7) >> 7) & foe
+                left = ((pawns & ~COLUMN_0) >> 9) & foe
+                shifted = ((double, 2 * step), (single, step), (right, -7), (left, -9))
+            for mask, shift in shifted:
+                mask &= allowed_targets
+                while mask:
+                    low = mask & -mask
+                    to = low.bit_length() - 1
+                    targets[to - shift] = targets.get(to - shift, 0) | low
+                    mask ^= low
+
+        # Checks and pins restrict the targets of every piece but the king, only king moves answer a double check
+        king = pieces['King']
+        if checks is None:
+            checks = self.checks_and_pins(color) if king else (0, FULL, {})
+        checkers, evasions, pins = checks
+        if checkers & (checkers - 1):
+            evasions = 0
+        if evasions != FULL or pins:
+            for sq, mask in targets.items():
+                targets[sq] = mask & evasions & pins.get(sq, FULL)
+
+        not_own = ~own & allowed_targets
+        not_own_piece = not_own & evasions
+        board = self.squares
+        others = own & ~pawns & ~king
+        while others:
+            low = others & -others
+            sq = low.bit_length() - 1
+            others ^= low
+            name = board[sq][1]
+            if name == 'Knight':
+                attacks = KNIGHT_ATTACKS[sq]
+            elif name == 'Rook':
+                attacks = rook_attacks(sq, occupied)
+            elif name == 'Bishop':
+                attacks = bishop_attacks(sq, occupied)
+            else:
+                attacks = rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+            targets[sq] = attacks & not_own_piece & pins.get(sq, FULL)
+        if king:
+            sq = king.bit_length() - 1
+            # The king is lifted, so the squares behind it along a checking line count as attacked
+            lifted = occupied & ~king
+            mask = 0
+            for to in squares(KING_ATTACKS[sq] & not_own):
+                if not self.attackers(to, enemy, lifted):
+                    mask |= 1 << to
+            targets[sq] = mask
+        return targets
+
+    def attackers(self, sq, color, occupied):
+        """
+        Returns the mask of the pieces of color which attack sq, with the occupied squares as blockers
+        """
+        pieces = self.pieces[color]
+        other = WHITE if color == BLACK else BLACK
+        return (KNIGHT_ATTACKS[sq] & pieces['Knight'] | KING_ATTACKS[sq] & pieces['King']
+                | PAWN_ATTACKS[other][sq] & pieces['Pawn']
+                | rook_attacks(sq, occupied) & (pieces['Rook'] | pieces['Queen'])
+                | bishop_attacks(sq, occupied) & (pieces['Bishop'] | pieces['Queen']))
+
+    def checks_and_pins(self, color):
+        """
+        Returns (checkers, evasions, pins) for the king of color: the mask of the enemy pieces giving check,
+        the mask of the squares a move other than a king move must go to while in single check
+        (FULL when not in check), and the mask of the squares every pinned piece may move to by its square
+        """
+        enemy = WHITE if color == BLACK else BLACK
+        king = (self.pieces[color]['King'] & -self.pieces[color]['King']).bit_length() - 1
+        occupied = self.occupied[BLACK] | self.occupied[WHITE]
+        foe = self.pieces[enemy]
+        checkers = self.attackers(king, enemy, occupied)
+        evasions = checkers if checkers else FULL
+        pins = {}
+        if not (ROOK_LINES[king] & (foe['Rook'] | foe['Queen']) | BISHOP_LINES[king] & (foe['Bishop'] | foe['Queen'])):
+            # No enemy slider on a line through the king, nothing can be pinned or checked along one
+            return checkers, evasions, pins
+        for d in DIRECTIONS:
+            sliders = foe['Queen'] | (foe['Rook'] if d in ROOK_DIRECTIONS else foe['Bishop'])
+            ray = RAYS[d][king]
+            if not ray & sliders:
+                continue
+            blockers = ray & occupied
+            first = nearest(d, blockers)
+            if 1 << first & sliders:
+                # A checking slider: the squares up to it block the check
+                evasions |= ray ^ RAYS[d][first]
+                continue
+            if not 1 << first & self.occupied[color]:
+                continue
+            rest = blockers & RAYS[d][first]
+            if rest:
+                second = nearest(d, rest)
+                if 1 << second & sliders:
+                    pins[first] = ray ^ RAYS[d][second]
+        return checkers, evasions, pins
+
+
+def all_available_black_moves(pos):
+    return pos.moves(BLACK)
+
+
+def all_available_white_moves(pos):
+    return pos.moves(WHITE)
+
+
+def staged_moves(pos, color):
+    """
+    Yields the moves of color in two stages, the captures and then the quiet moves, like game.staged_moves
+    """
+    checks = pos.checks_and_pins(color) if pos.pieces[color]['King'] else (0, FULL, {})
+    yield pos.moves(color, CAPTURES, checks)
+    yield pos.moves(color, QUIET_MOVES, checks)
+
+
+def legal_move(pos, color, mid):
+    """
+    Returns (from square, to square) of the move id if it is a legal move of color, None otherwise
+    """
+    frm, to = divmod(mid, 64)
+    piece = pos.squares[frm]
+    if piece is None or piece[0] != color:
+        return None
+    own = pos.occupied[color]
+    occupied = own | pos.occupied[BLACK if color == WHITE else WHITE]
+    name = piece[1]
+    if name == 'Pawn':
+        step = 8 if color == BLACK else -8
+        if to == frm + step:
+            reached = not occupied >> to & 1
+        elif to == frm + 2 * step:
+            reached = pos.unmoved >> frm & 1 and not (occupied >> (frm + step) & 1 or occupied >> to & 1)
+        else:
+            reached = (PAWN_ATTACKS[color][frm] & occupied) >> to & 1
+    elif name == 'Knight':
+        reached = KNIGHT_ATTACKS[frm] >> to & 1
+    elif name == 'King':
+        reached = KING_ATTACKS[frm] >> to & 1
+    elif name == 'Rook':
+        reached = rook_attacks(frm, occupied) >> to & 1
+    elif name == 'Bishop':
+        reached = bishop_attacks(frm, occupied) >> to & 1
+    else:
+        reached = (rook_attacks(frm, occupied) | bishop_attacks(frm, occupied)) >> to & 1
+    if not reached or own >> to & 1:
+        return None
+    undo = make_move(pos, frm, to)
+    legal = not in_check(pos, color)
+    unmake_move(pos, undo)
+    return (frm, to) if legal else None
+
+
+def in_check(pos, color):
+    """
+    Returns true if the king of color is attacked
+    """
+    king = pos.pieces[color]['King']
+    if not king:
+        return False
+    return bool(pos.attackers(king.bit_length() - 1, WHITE if color == BLACK else BLACK, pos.occupied[BLACK] | pos.occupied[WHITE]))
+
+
+def make_move(pos, frm, to):
+    """
+    Moves the piece on square frm to square to, capturing whatever stands there.
+    Returns an undo record for unmake_move.
+    """
+    squares = pos.squares
+    captured = squares[to]
+    undo = (frm, to, captured, pos.unmoved, pos.key, pos.mg, pos.eg, pos.phase)
+    if captured is not None:
+        pos.remove(to)
+    color, name = piece = squares[frm]
+    flip = (1 << frm) | (1 << to)
+    pos.pieces[color][name] ^= flip
+    pos.occupied[color] ^= flip
+    squares[frm] = None
+    squares[to] = piece
+    pos.unmoved &= ~flip
+    zobrist = ZOBRIST[color][name]
+    pos.key ^= zobrist[frm] ^ zobrist[to] ^ ZOBRIST_BLACK_TO_MOVE
+    middlegame = MIDDLEGAME[color][name]
+    endgame = ENDGAME[color][name]
+    pos.mg += middlegame[to] - middlegame[frm]
+    pos.eg += endgame[to] - endgame[frm]
+    pos.turn = BLACK if pos.turn == WHITE else WHITE
+    return undo
+
+
+def unmake_move(pos, undo):
+    frm, to, captured, pos.unmoved, pos.key, pos.mg, pos.eg, pos.phase = undo
+    squares = pos.squares
+    color, name = piece = squares[to]
+    flip = (1 << frm) | (1 << to)
+    pos.pieces[color][name] ^= flip
+    pos.occupied[color] ^= flip
+    squares[frm] = piece
+    squares[to] = captured
+    if captured is not None:
+        # The score terms and the key were restored above, only the masks of the captured piece are
+        bit = 1 << to
+        pos.pieces[captured[0]][captured[1]] |= bit
+        pos.occupied[captured[0]] |= bit
+    pos.turn = BLACK if pos.turn == WHITE else WHITE
+
+
+def make_null_move(pos):
+    """
+    Passes the move to the other side
+    """
+    pos.key ^= ZOBRIST_BLACK_TO_MOVE
+    pos.turn = BLACK if pos.turn == WHITE else WHITE
+
+
+unmake_null_move = make_null_move
+
+
+def material(pos, color):
+    """
+    Returns the strength points of the pieces of color other than pawns and the king
+    """
+    return sum(Points[name] * bin(mask).count('1') for name, mask in pos.pieces[color].items() if name != 'Pawn' and name != 'King')
+
+
+def move_id(frm, to):
+    return frm * 64 + to
+
+
+def move_from_id(pos, mid):
+    return divmod(mid, 64)
+
+
+def capture(pos, frm, to):
+    """
+    Returns the names of the piece the move captures (None if it captures nothing) and of the moving piece
+    """
+    target = pos.squares[to]
+    return (None if target is None else target[1]), pos.squares[frm][1]
+
+
+def terminal(pos):
+    """
+    Returns true if any king is dead
+    """
+    return not (pos.pieces[BLACK]['King'] and pos.pieces[WHITE]['King'])
+
+
+def score_terms(pos):
+    """
+    Returns the middlegame score, endgame score and game phase of the position computed from scratch
+    """
+    mg = eg = phase = 0
+    for sq, entry in enumerate(pos.squares):
+        if entry is not None:
+            color, name = entry
+            mg += MIDDLEGAME[color][name][sq]
+            eg += ENDGAME[color][name][sq]
+            phase += PHASE[name]
+    return mg, eg, phase
+
+
+def evaluation(pos):
+    """
+    Returns the same score as game.evaluation for the position
+    """
+    val = blend(pos.mg, pos.eg, pos.phase)
+    if game.DEBUG_EVAL:
+        full = blend(*score_terms(pos))
+        assert val == full, f"incremental evaluation {val} != full evaluation {full}"
+    return val
+
+
+def same_moves(board, pos, color):
+    """
+    Returns true if the bitboard position generates exactly the moves of the Piece generators
+    """
+    from game import all_available_black_moves as black, all_available_white_moves as white
+    expected = set()
+    for piece, mvs in (black(board) if color == BLACK else white(board)):
+        for mv in mvs or ():
+            expected.add((square(piece.pos), square(mv)))
+    found = set((frm, to) for frm, mvs in pos.moves(color) for to in mvs)
+    return expected == found
+
+
+if __name__ == "__main__":
+    import math
+    import random
+    import sys
+    import time
+    import bitboard
+    import game
+    from runner import minimize, maximize, SearchContext
+
+    # Compare move sets along random games, then the search speed of both backends
+    random.seed(0)
+    checked = 0
+    for _ in range(50):
+        board = game.game_init(WHITE)[0]
+        color = WHITE
+        for _ in range(80):
+            pos = bitboard.BitBoard.from_board(board)
+            if not bitboard.same_moves(board, pos, color):
+                print("Move sets differ:")
+                game.display(board)
+                sys.exit(1)
+            checked += 1
+            mvs = game.all_available_white_moves(board) if color == WHITE else game.all_available_black_moves(board)
+            choices = [(piece, mv) for piece, targets in mvs for mv in targets]
+            if not choices:
+                break
+            game.move(board, *random.choice(choices))
+            color = BLACK if color == WHITE else WHITE
+    print(f"Move sets identical in {checked} positions")
+
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    board = game.game_init(WHITE)[0]
+    # Without null move pruning and reductions, which depend on the move order, both backends give the same scores
+    for name, position, backend in (('game', board, game), ('bitboard', bitboard.BitBoard.from_board(board), bitboard)):
+        start = time.perf_counter()
+        white = maximize(position, depth, -math.inf, math.inf, SearchContext(backend, null_move=False, lmr=False))[2]
+        black = minimize(position, depth, -math.inf, math.inf, SearchContext(backend, null_move=False, lmr=False))[2]
+        print(f"{name:>8}: depth {depth} searched in {time.perf_counter() - start:.3f}s, scores {white} / {black}")
@@ -0,0 +1,210 @@
+"""
+Opening book
+
+Books use the Polyglot file format: a sorted array of 16 byte big-endian entries (key, move, weight, learn),
+where a move packs to file, to rank, from file and from rank in 3 bits each. Positions are keyed by the Zobrist
+key of this engine (board.key) instead of the Polyglot random numbers, since the engine has no castling
+or en passant, so books built for other engines do not match and have to be built with this file.
+
+The book file is memory-mapped and binary-searched, so opening and probing a large book reads only a few pages.
+
+    python book.py build games.pgn book.bin --plies 20
+    python book.py probe book.bin --fen FEN
+"""
+from game import BLACK, WHITE, EMPTY, make_move, game_init, legal_actions
+from notation import parse_san, square_name, board_from_fen, START_FEN
+from point import Point
+import argparse
+import mmap
+import random
+import re
+import struct
+
+ENTRY = struct.Struct('>QHHI')
+KEY = struct.Struct('>Q')
+RESULTS = {'1-0': WHITE, '0-1': BLACK, '1/2-1/2': None}
+
+
+def encode_move(frm, to):
+    """
+    Returns the Polyglot move of the move from square frm to square to, both (x, y) board coordinates
+    """
+    return (7 - frm[0]) << 9 | frm[1] << 6 | (7 - to[0]) << 3 | to[1]
+
+
+def decode_move(move):
+    """
+    Returns the (x, y) board coordinates of the from and to squares of a Polyglot move
+    """
+    return (7 - (move >> 9 & 7), move >> 6 & 7), (7 - (move >> 3 & 7), move & 7)
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.size = 0
+        self.data = None
+        self.file.seek(0, 2)
+        if self.file.tell() >= ENTRY.size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self.data) // ENTRY.size
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def entries(self, key):
+        """
+        Returns the list of (move, weight) stored for the position key
+        """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if KEY.unpack_from(self.data, mid * ENTRY.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        for index in range(lo, self.size):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((move, weight))
+        return result
+
+    def moves(self, board):
+        """
+        Returns the list of (piece, Point, weight) of the book moves which can be played on the board
+        """
+        result = []
+        for move, weight in self.entries(board.key):
+            frm, to = decode_move(move)
+            piece = board[frm[0]][frm[1]]
+            if piece == EMPTY or piece.color != board.turn or Point(*to) not in legal_actions(board, piece):
+                continue
+            result.append((piece, Point(*to), weight))
+        return result
+
+    def choose(self, board, rng=random):
+        """
+        Returns (piece, Point) of a book move picked with probability proportional to its weight,
+        None if the book has no move for the board
+        """
+        moves = self.moves(board)
+        if not moves:
+            return None
+        weights = [weight for _, _, weight in moves]
+        if not any(weights):
+            weights = None
+        piece, mv, _ = rng.choices(moves, weights)[0]
+        return piece, mv
+
+
+def read_games(path):
+    """
+    Yields (result, list of SAN moves) for every game of a PGN file
+    """
+    result, text = None, []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                if text:
+                    yield result, san_moves(' '.join(text))
+                    result, text = None, []
+                match = re.match(r'\[Result "([^"]*)"\]', line)
+                if match:
+                    result = match.group(1)
+            elif line and not line.startswith('%'):
+                text.append(line)
+    if text:
+        yield result, san_moves(' '.join(text))
+
+
+def san_moves(text):
+    """
+    Returns the SAN moves of PGN movetext, without comments, variations, move numbers, annotations and result
+    """
+    text = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', text)
+    while '(' in text:
+        stripped = re.sub(r'\([^()]*\)', ' ', text)
+        if stripped == text:
+            break
+        text = stripped
+    moves = []
+    for token in text.split():
+        token = re.sub(r'^\d+\.+', '', token)
+        if not token or token.startswith('$') or token in RESULTS or token == '*':
+            continue
+        moves.append(token)
+    return moves
+
+
+def build(pgn_path, book_path, plies=20, min_count=1):
+    """
+    Builds a book from the first plies moves of every game of a PGN file.
+    A move weighs 2 for every game the side playing it won and 1 for every draw, scaled down to fit 16 bits.
+    Moves played in fewer than min_count games are left out. Returns (games read, entries written).
+    """
+    weights = {}
+    counts = {}
+    games = 0
+    for result, moves in read_games(pgn_path):
+        games += 1
+        board = game_init(WHITE)[0]
+        winner = RESULTS.get(result, None)
+        for san in moves[:plies]:
+            try:
+                piece, mv = parse_san(board, san)
+            except ValueError:
+                # A castling, promotion or en passant move: the rest of the game can not be followed
+                break
+            entry = (board.key, encode_move((piece.pos.x, piece.pos.y), (mv.x, mv.y)))
+            counts[entry] = counts.get(entry, 0) + 1
+            weights[entry] = weights.get(entry, 0) + (2 if winner == board.turn else 1 if result == '1/2-1/2' else 0)
+            make_move(board, piece, mv)
+    entries = [(key, move, weights[key, move]) for key, move in counts if counts[key, move] >= min_count]
+    scale = max([1] + [weight for _, _, weight in entries]) / 0xFFFF
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(book_path, 'wb') as f:
+        for key, move, weight in entries:
+            f.write(ENTRY.pack(key, move, int(weight / scale) if scale > 1 else weight, 0))
+    return games, len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or probe an opening book")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="build a book from a PGN file")
+    build_parser.add_argument('pgn')
+    build_parser.add_argument('book')
+    build_parser.add_argument('--plies', type=int, default=20, help="moves of every game added to the book")
+    build_parser.add_argument('--min-count', type=int, default=1, help="leave out moves played in fewer games")
+    probe_parser = commands.add_parser('probe', help="list the book moves of a position")
+    probe_parser.add_argument('book')
+    probe_parser.add_argument('--fen', default=START_FEN)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        games, entries = build(args.pgn, args.book, args.plies, args.min_count)
+        print(f"{entries} book entries from {games} games")
+        return
+    board = board_from_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        moves = book.moves(board)
+        total = sum(weight for _, _, weight in moves) or 1
+        for piece, mv, weight in moves:
+            print(f"{square_name(piece.pos.x, piece.pos.y)}{square_name(mv.x, mv.y)} weight {weight} ({100 * weight / total:.1f}%)")
+        if not moves:
+            print("No book moves")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Batched frontier evaluation
+
+At depth 1 every child of a node is a leaf, so the search makes each move, evaluates the position and takes
+the move back, one child at a time. With batching the children are instead encoded as an int8 array of shape
+(N, 64), one signed piece code per square (positive for white), and scored together: the middlegame and endgame
+score of a position is the sum of its squares' entries in the piece-square tables (strength points included),
+which NumPy gathers and sums for the whole batch at once, then blends by the game phase exactly as
+game.evaluation does. The search then runs its alpha-beta loop over the returned scores.
+
+NumPy is optional and only needed for this mode (SearchContext(batch_eval=True), runner.py --batch-eval).
+Run this file to compare the cost per leaf of scalar and batched evaluation for several batch sizes.
+"""
+from game import BLACK, WHITE, MIDDLEGAME, ENDGAME, PHASE, PHASE_TOTAL
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NAMES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+# Piece code of every color and name: 1 to 6 for white, -1 to -6 for black, 0 for an empty square
+CODES = {color: {name: (i + 1) * (1 if color == WHITE else -1) for i, name in enumerate(NAMES)} for color in (BLACK, WHITE)}
+
+# Tables indexed by piece code + 6 (and square), built on first use
+_tables = None
+
+
+def require():
+    """
+    Raises ImportError with instructions if NumPy is not installed
+    """
+    if np is None:
+        raise ImportError("batched frontier evaluation needs NumPy, install it with 'pip install numpy' "
+                          "or search without batch_eval")
+
+
+def tables():
+    """
+    Returns the (middlegame, endgame, phase) tables as NumPy arrays: the first two of shape (13, 64)
+    with the signed score of every piece code on every square, the last of shape (13,)
+    """
+    global _tables
+    if _tables is None:
+        require()
+        mg = np.zeros((13, 64), dtype=np.int64)
+        eg = np.zeros((13, 64), dtype=np.int64)
+        phase = np.zeros(13, dtype=np.int64)
+        for color in (BLACK, WHITE):
+            for name, code in CODES[color].items():
+                mg[code + 6] = MIDDLEGAME[color][name]
+                eg[code + 6] = ENDGAME[color][name]
+                phase[code + 6] = PHASE[name]
+        _tables = mg, eg, phase
+    return _tables
+
+
+def encode(board):
+    """
+    Returns the int8 array of shape (64,) with the piece code of every square of a game.Board or bitboard.BitBoard
+    """
+    require()
+    codes = np.zeros(64, dtype=np.int8)
+    if hasattr(board, 'occupied'):
+        for sq, occupant in enumerate(board.squares):
+            if occupant is not None:
+                codes[sq] = CODES[occupant[0]][occupant[1]]
+    else:
+        for color in (BLACK, WHITE):
+            for piece in board.pieces[color]:
+                codes[piece.pos.x * 8 + piece.pos.y] = CODES[color][piece.name]
+    return codes
+
+
+def children(board, moves, backend):
+    """
+    Returns the int8 array of shape (N, 64) of the positions after each of the N (piece, move) pairs
+    """
+    squares = np.array([backend.move_id(piece, mv) for piece, mv in moves], dtype=np.int64)
+    frm, to = squares // 64, squares % 64
+    base = encode(board)
+    batch = np.repeat(base[None, :], len(moves), axis=0)
+    rows = np.arange(len(moves))
+    batch[rows, to] = base[frm]
+    batch[rows, frm] = 0
+    return batch
+
+
+def evaluate(batch):
+    """
+    Returns the int64 array of the scores of the (N, 64) batch of encoded positions, equal to game.evaluation
+    """
+    mg_table, eg_table, phase_table = tables()
+    index = batch.astype(np.int64) + 6
+    squares = np.arange(64)
+    mg = mg_table[index, squares].sum(axis=1)
+    eg = eg_table[index, squares].sum(axis=1)
+    phase = np.minimum(phase_table[index].sum(axis=1), PHASE_TOTAL)
+    return (mg * phase + eg * (PHASE_TOTAL - phase)) // PHASE_TOTAL
+
+
+def evaluate_children(board, moves, backend):
+    """
+    Returns the list of the scores of the positions after each of the (piece, move) pairs
+    """
+    return evaluate(children(board, moves, backend)).tolist()
+
+
+if __name__ == "__main__":
+    import argparse
+    import math
+    import random
+    import time
+    import game
+    from bench import positions
+    from runner import SearchContext, minimize, maximize
+
+    parser = argparse.ArgumentParser(description="Compare the cost per leaf of scalar and batched evaluation")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 16, 32, 64, 256, 1024])
+    parser.add_argument('--leaves', type=int, default=20000, help="leaves evaluated per measurement")
+    parser.add_argument('--depth', type=int, default=4, help="depth of the search comparison")
+    args = parser.parse_args()
+    require()
+
+    # Frontier moves from random positions, checked against the scalar evaluation
+    boards = positions(8)
+    frontier = []
+    for board in boards:
+        moves = game.all_available_white_moves(board) if board.turn == WHITE else game.all_available_black_moves(board)
+        pairs = [(piece, mv) for piece, mvs in moves for mv in mvs]
+        expected = []
+        for piece, mv in pairs:
+            undo = game.make_move(board, piece, mv)
+            expected.append(game.evaluation(board))
+            game.unmake_move(board, undo)
+        assert evaluate_children(board, pairs, game) == expected
+        frontier.append((board, pairs))
+    print(f"Batched scores equal the scalar evaluation for {sum(len(pairs) for _, pairs in frontier)} children")
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    done = 0
+    while done < args.leaves:
+        board, pairs = rng.choice(frontier)
+        for piece, mv in pairs:
+            undo = game.make_move(board, piece, mv)
+            game.evaluation(board)
+            game.unmake_move(board, undo)
+        done += len(pairs)
+    scalar = (time.perf_counter() - start) / done
+    print(f"{'scalar':>8}: {1e6 * scalar:6.2f} us per leaf (make, evaluate, unmake)")
+    for size in args.sizes:
+        batches = []
+        for board, pairs in frontier:
+            batch = (pairs * (size // len(pairs) + 1))[:size]
+            batches.append((board, batch))
+        start = time.perf_counter()
+        done = 0
+        while done < args.leaves:
+            board, batch = rng.choice(batches)
+            evaluate_children(board, batch, game)
+            done += len(batch)
+        per_leaf = (time.perf_counter() - start) / done
+        print(f"{size:>8}: {1e6 * per_leaf:6.2f} us per leaf ({scalar / per_leaf:.2f}x scalar)")
+
+    # Whole searches: the same scores, slightly fewer nodes since a leaf is never searched twice by PVS
+    for batch_eval in (False, True):
+        nodes = 0
+        scores = []
+        start = time.perf_counter()
+        for board in boards:
+            ctx = SearchContext(batch_eval=batch_eval)
+            search = maximize if board.turn == WHITE else minimize
+            scores.append(search(board, args.depth, -math.inf, math.inf, ctx)[2])
+            nodes += ctx.nodes
+        print(f"depth {args.depth} search, batch_eval={batch_eval}: {nodes} nodes, "
+              f"{time.perf_counter() - start:.2f}s, scores {scores}")
@@ -3,19 +3,108 @@ Chess Game
 """
 from movements import *
 from point import Point
-from copy import deepcopy
+import os
+import random
 
 
 # Strength for pieces on the board
 Points = {'Pawn': 10, 'Rook': 50, 'Bishop': 30, 'Knight': 30, 'Queen': 90, 'King': 900}
+# Score of a checkmate. Plies are counted to the capture of the mated king, so a side mated
+# n plies from the root scores MATE - n - 1 for the other side.
+MATE = Points['King']
+
+# Piece-square tables: bonus for a piece standing on a square, as (middlegame, endgame) tables.
+# Written from white's side of the board, row 0 first; black pieces use the mirrored square.
+_KNIGHT = (-5, -4, -3, -3, -3, -3, -4, -5,
+           -4, -2,  0,  0,  0,  0, -2, -4,
+           -3,  0,  1,  2,  2,  1,  0, -3,
+           -3,  1,  2,  2,  2,  2,  1, -3,
+           -3,  0,  2,  2,  2,  2,  0, -3,
+           -3,  1,  1,  2,  2,  1,  1, -3,
+           -4, -2,  0,  1,  1,  0, -2, -4,
+           -5, -4, -3, -3, -3, -3, -4, -5)
+_BISHOP = (-2, -1, -1, -1, -1, -1, -1, -2,
+           -1,  0,  0,  0,  0,  0,  0, -1,
+           -1,  0,  1,  1,  1,  1,  0, -1,
+           -1,  1,  1,  1,  1,  1,  1, -1,
+           -1,  0,  1,  1,  1,  1,  0, -1,
+           -1,  1,  1,  1,  1,  1,  1, -1,
+           -1,  1,  0,  0,  0,  0,  1, -1,
+           -2, -1, -1, -1, -1, -1, -1, -2)
+_ROOK = ( 0,  0,  0,  0,  0,  0,  0,  0,
+          1,  2,  2,  2,  2,  2,  2,  1,
+         -1,  0,  0,  0,  0,  0,  0, -1,
+         -1,  0,  0,  0,  0,  0,  0, -1,
+         -1,  0,  0,  0,  0,  0,  0, -1,
+         -1,  0,  0,  0,  0,  0,  0, -1,
+         -1,  0,  0,  0,  0,  0,  0, -1,
+          0,  0,  0,  1,  1,  0,  0,  0)
+_QUEEN = (-2, -1, -1,  0,  0, -1, -1, -2,
+          -1,  0,  0,  0,  0,  0,  0, -1,
+          -1,  0,  1,  1,  1,  1,  0, -1,
+           0,  0,  1,  1,  1,  1,  0,  0,
+           0,  0,  1,  1,  1,  1,  0,  0,
+          -1,  1,  1,  1,  1,  1,  0, -1,
+          -1,  0,  1,  0,  0,  0,  0, -1,
+          -2, -1, -1,  0,  0, -1, -1, -2)
+PIECE_SQUARE_TABLES = {
+    'Pawn': (( 0,  0,  0,  0,  0,  0,  0,  0,
+               5,  5,  5,  5,  5,  5,  5,  5,
+               1,  1,  2,  3,  3,  2,  1,  1,
+               0,  0,  1,  3,  3,  1,  0,  0,
+               0,  0,  0,  2,  2,  0,  0,  0,
+               0,  0, -1,  0,  0, -1,  0,  0,
+               0,  1,  1, -2, -2,  1,  1,  0,
+               0,  0,  0,  0,  0,  0,  0,  0),
+             ( 0,  0,  0,  0,  0,  0,  0,  0,
+               8,  8,  8,  8,  8,  8,  8,  8,
+               5,  5,  5,  5,  5,  5,  5,  5,
+               3,  3,  3,  3,  3,  3,  3,  3,
+               2,  2,  2,  2,  2,  2,  2,  2,
+               1,  1,  1,  1,  1,  1,  1,  1,
+               0,  0,  0,  0,  0,  0,  0,  0,
+               0,  0,  0,  0,  0,  0,  0,  0)),
+    'Knight': (_KNIGHT, _KNIGHT),
+    'Bishop': (_BISHOP, _BISHOP),
+    'Rook': (_ROOK, _ROOK),
+    'Queen': (_QUEEN, _QUEEN),
+    'King': ((-3, -4, -4, -5, -5, -4, -4, -3,
+              -3, -4, -4, -5, -5, -4, -4, -3,
+              -3, -4, -4, -5, -5, -4, -4, -3,
+              -3, -4, -4, -5, -5, -4, -4, -3,
+              -2, -3, -3, -4, -4, -3, -3, -2,
+              -1, -2, -2, -2, -2, -2, -2, -1,
+               2,  2,  0,  0,  0,  0,  2,  2,
+               2,  3,  1,  0,  0,  1,  3,  2),
+             (-5, -4, -3, -2, -2, -3, -4, -5,
+              -3, -2, -1,  0,  0, -1, -2, -3,
+              -3, -1,  2,  3,  3,  2, -1, -3,
+              -3, -1,  3,  4,  4,  3, -1, -3,
+              -3, -1,  3,  4,  4,  3, -1, -3,
+              -3, -1,  2,  3,  3,  2, -1, -3,
+              -3, -3,  0,  0,  0,  0, -3, -3,
+              -5, -3, -3, -3, -3, -3, -3, -5)),
+}
+
+# Game phase weights: PHASE_TOTAL with all the pieces on the board, 0 with only kings and pawns.
+# The score blends the middlegame and endgame tables by the phase left.
+PHASE = {'Pawn': 0, 'Knight': 1, 'Bishop': 1, 'Rook': 2, 'Queen': 4, 'King': 0}
+PHASE_TOTAL = 24
     
 # Directions at which the respective piece can move
-PIECES_MOVING_DIRECTION = {'Queen': (front, back, right, left, diag_right_backward, diag_right_forward, diag_left_forward, diag_left_backward),
+PIECES_MOVING_DIRECTION = {'Queen': (queen_moves, ),
                             'Pawn': (pawn_rules, ), 
-                            'Rook': (front, back, right, left),
-                            'Knight': (L_front, L_back),
-                            'Bishop': (diag_right_forward, diag_right_backward, diag_left_forward, diag_left_backward),
-                            'King': (one_step_front, one_step_back, one_step_right, one_step_left, one_step_diag_right_forward, one_step_diag_right_backward, one_step_diag_left_backward, one_step_diag_left_forward)}
+                            'Rook': (rook_moves, ),
+                            'Knight': (knight_moves, ),
+                            'Bishop': (bishop_moves, ),
+                            'King': (king_moves, )}
+# Generators of the moves of each piece which capture an enemy piece
+PIECES_CAPTURES = {'Queen': queen_captures, 'Pawn': pawn_captures, 'Rook': rook_captures,
+                   'Knight': knight_captures, 'Bishop': bishop_captures, 'King': king_captures}
+# Stages of the move generation: every move, only the captures, only the moves to an empty square
+ALL_MOVES = 0
+CAPTURES = 1
+QUIET_MOVES = 2
 PIECES_NAMES = ['Pawn-1',
                 'Pawn-2', 
                 'Pawn-3', 
@@ -38,7 +127,86 @@ BLACK = 'B'
 WHITE = 'W'
 EMPTY = '.'
 
+# Signed strength plus piece-square bonus for every color, piece and square (x * 8 + y),
+# as the middlegame and endgame parts of the score
+MIDDLEGAME = {color: {name: [(1 if color == WHITE else -1) * (Points[name] + tables[0][sq if color == WHITE else (7 - sq // 8) * 8 + sq % 8])
+                             for sq in range(64)] for name, tables in PIECE_SQUARE_TABLES.items()} for color in (BLACK, WHITE)}
+ENDGAME = {color: {name: [(1 if color == WHITE else -1) * (Points[name] + tables[1][sq if color == WHITE else (7 - sq // 8) * 8 + sq % 8])
+                          for sq in range(64)] for name, tables in PIECE_SQUARE_TABLES.items()} for color in (BLACK, WHITE)}
+
+# Recomputes the score from scratch at every evaluation and checks it against the incremental one
+DEBUG_EVAL = os.environ.get('CHESS_DEBUG_EVAL') == '1'
+
+# Zobrist keys: one random 64-bit number per color, piece and square, and one for black to move.
+# Seeded, so the keys of a position are the same in every process and every run.
+_zobrist_random = random.Random(2020)
+ZOBRIST = {color: {name: [_zobrist_random.getrandbits(64) for _ in range(64)] for name in Points} for color in (BLACK, WHITE)}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+
+class Board(list):
+    """
+    8 * 8 board, a list of rows holding Piece objects or EMPTY
+    turn: color to move
+    key: Zobrist key of the position
+    mg, eg, phase: middlegame score, endgame score and game phase
+    pieces: live pieces of every color, so move generation does not scan the empty squares
+    kings: king of every color, None once it is captured
+    key, mg, eg, phase, pieces and kings are kept up to date by make_move and unmake_move
+    """
+    def __init__(self, rows, turn=WHITE):
+        super().__init__(rows)
+        self.turn = turn
+        self.key = zobrist_key(self)
+        self.mg, self.eg, self.phase = score_terms(self)
+        self.pieces = {BLACK: [], WHITE: []}
+        self.kings = {BLACK: None, WHITE: None}
+        for row in self:
+            for piece in row:
+                if piece != EMPTY and piece.alive:
+                    self.pieces[piece.color].append(piece)
+                    if piece.name == 'King':
+                        self.kings[piece.color] = piece
+
+
+def zobrist_key(board):
+    """
+    Returns the Zobrist key of the board computed from scratch
+    """
+    key = ZOBRIST_BLACK_TO_MOVE if board.turn == BLACK else 0
+    for i in range(8):
+        for j in range(8):
+            if board[i][j] != EMPTY:
+                key ^= ZOBRIST[board[i][j].color][board[i][j].name][i * 8 + j]
+    return key
+
+
+def score_terms(board):
+    """
+    Returns the middlegame score, endgame score and game phase of the board computed from scratch
+    """
+    mg = eg = phase = 0
+    for i in range(8):
+        for j in range(8):
+            piece = board[i][j]
+            if piece != EMPTY:
+                mg += MIDDLEGAME[piece.color][piece.name][i * 8 + j]
+                eg += ENDGAME[piece.color][piece.name][i * 8 + j]
+                phase += PHASE[piece.name]
+    return mg, eg, phase
+
+
+def blend(mg, eg, phase):
+    """
+    Returns the score between the middlegame and endgame scores for the game phase
+    """
+    phase = min(phase, PHASE_TOTAL)
+    return (mg * phase + eg * (PHASE_TOTAL - phase)) // PHASE_TOTAL
+
+
 class Piece:                   
+    __slots__ = ('color', 'name', 'num', 'pos', 'init', 'alive')
+
     def __init__(self, name, pos, color): 
         """
         name: Name of the piece ('King', 'Queen', 'Bishop-1', 'Knight-1', 'Rook-2')
@@ -73,15 +241,11 @@ class Piece:
                     l += moves_available
             return l
 
-    def result(self, board, action):
+    def captures(self, board):
         """
-        Returns the board that results from making piece move on the board.
-        piece: Piece class Object
-        action: Point class object
+        Returns the actions of the piece which capture an enemy piece, in the order actions returns them
         """
-        new_board = deepcopy(board)
-        move(new_board, deepcopy(self), action)
-        return new_board
+        return PIECES_CAPTURES[self.name](board, self.pos, self.color)
 
     def __repr__(self): 
         """
@@ -89,14 +253,6 @@ class Piece:
         """
         return SYMBOLS[self.color + self.name]
 
-    def getPiecePoints(self): 
-        """
-        Returns strength point for the piece
-            • Positive strength if color is white
-            • Negative strength if color is black
-        """
-        return Points[self.name] if self.color == WHITE else - Points[self.name]
-
 
 def game_init(player): 
     """
@@ -129,100 +285,355 @@ def game_init(player):
     pieces_insert(board, 0, PIECES_NAMES[8:], BLACK)
     # Inserting White (Rooks, Bishops, Knight, Queen, King)
     pieces_insert(board, 7, PIECES_NAMES[8:], WHITE)
-    return (board, player, enemy, player_pieces, enemy_pieces)
+    return (Board(board), player, enemy, player_pieces, enemy_pieces)
 
 
 def move(board, piece, new_pos): 
     """
-    Moves the piece to new position in the board, if move is valid
+    Moves the piece to new position in the board, if move is legal
     piece: Piece Class Object
     new_pos: Point class Object
     """
-    if new_pos not in piece.actions(board):
-        return False
-    x, y = piece.pos.x, piece.pos.y 
-    if board[new_pos.x][new_pos.y] != EMPTY:
-        kill(board, board[new_pos.x][new_pos.y])
-    if board[new_pos.x][new_pos.y] == EMPTY:
-        board[piece.pos.x][piece.pos.y] = EMPTY
-        board[new_pos.x][new_pos.y] = piece
-        piece.pos.x = new_pos.x
-        piece.pos.y = new_pos.y
-    piece.init = True
-    if piece.pos.x == x and piece.pos.y == y:
+    if new_pos not in legal_actions(board, piece):
         return False
+    make_move(board, piece, new_pos)
     return True
 
-def kill(board, piece): 
+
+def make_move(board, piece, new_pos):
     """
-    Kills the piece, and frees the position in the board
+    Moves the piece to new position in the board in place, without validating the move.
+    Returns an undo record (piece, captured piece or None, previous x, previous y, previous init,
+    previous key, previous mg, previous eg, previous phase, index of the captured piece in its piece list)
+    which restores the board when passed to unmake_move.
     piece: Piece Class Object
+    new_pos: Point class Object
+    """
+    x, y = piece.pos.x, piece.pos.y
+    frm = x * 8 + y
+    to = new_pos.x * 8 + new_pos.y
+    captured = board[new_pos.x][new_pos.y]
+    if captured == EMPTY:
+        captured = None
+        index = None
+    else:
+        index = board.pieces[captured.color].index(captured)
+    undo = (piece, captured, x, y, piece.init, board.key, board.mg, board.eg, board.phase, index)
+    keys = ZOBRIST[piece.color][piece.name]
+    mg = MIDDLEGAME[piece.color][piece.name]
+    eg = ENDGAME[piece.color][piece.name]
+    board.key ^= keys[frm] ^ keys[to] ^ ZOBRIST_BLACK_TO_MOVE
+    board.mg += mg[to] - mg[frm]
+    board.eg += eg[to] - eg[frm]
+    if captured is not None:
+        captured.alive = False
+        board.key ^= ZOBRIST[captured.color][captured.name][to]
+        board.mg -= MIDDLEGAME[captured.color][captured.name][to]
+        board.eg -= ENDGAME[captured.color][captured.name][to]
+        board.phase -= PHASE[captured.name]
+        del board.pieces[captured.color][index]
+        if captured.name == 'King':
+            board.kings[captured.color] = None
+    board[x][y] = EMPTY
+    board[new_pos.x][new_pos.y] = piece
+    piece.pos.x = new_pos.x
+    piece.pos.y = new_pos.y
+    piece.init = True
+    board.turn = BLACK if board.turn == WHITE else WHITE
+    return undo
+
+
+def unmake_move(board, undo):
+    """
+    Takes back the move described by the undo record returned from make_move
+    """
+    piece, captured, x, y, init, board.key, board.mg, board.eg, board.phase, index = undo
+    if captured is None:
+        board[piece.pos.x][piece.pos.y] = EMPTY
+    else:
+        captured.alive = True
+        board[piece.pos.x][piece.pos.y] = captured
+        board.pieces[captured.color].insert(index, captured)
+        if captured.name == 'King':
+            board.kings[captured.color] = captured
+    board[x][y] = piece
+    piece.pos.x = x
+    piece.pos.y = y
+    piece.init = init
+    board.turn = BLACK if board.turn == WHITE else WHITE
+
+
+def make_null_move(board):
+    """
+    Passes the move to the other side, as the null move pruning of the search does
+    """
+    board.key ^= ZOBRIST_BLACK_TO_MOVE
+    board.turn = BLACK if board.turn == WHITE else WHITE
+
+
+unmake_null_move = make_null_move
+
+
+def material(board, color):
+    """
+    Returns the strength points of the pieces of color other than pawns and the king
+    """
+    return sum(Points[piece.name] for piece in board.pieces[color] if piece.name != 'Pawn' and piece.name != 'King')
+
+
+def move_id(piece, new_pos):
+    """
+    Returns the move as a single integer (from square * 64 + to square), used to remember moves
     """
-    board[piece.pos.x][piece.pos.y] = EMPTY # Making the piece pos empty
-    piece.alive = False
+    return (piece.pos.x * 8 + piece.pos.y) * 64 + new_pos.x * 8 + new_pos.y
+
+
+def capture(board, piece, new_pos):
+    """
+    Returns the names of the piece the move captures (None if it captures nothing) and of the moving piece
+    """
+    target = board[new_pos.x][new_pos.y]
+    return (None if target == EMPTY else target.name), piece.name
+
+
+def move_from_id(board, mid):
+    """
+    Returns the piece and the Point class object of the move with the given move_id
+    """
+    frm, to = divmod(mid, 64)
+    return board[frm // 8][frm % 8], Point(to // 8, to % 8)
 
 
 def evaluation(board): 
     """
-    Returns the sum of all the strength points of the pieces in the board
+    Returns the score of the board: the strength points of the pieces plus their piece-square bonuses,
+    blended between middlegame and endgame by the game phase. Positive when white is ahead.
+    Read from the incrementally updated terms of the board; checked against a full recompute if DEBUG_EVAL is set.
     """
-    val = 0
-    for i in range(8):
-        for j in range(8):
-            if board[i][j] != EMPTY:
-                val += board[i][j].getPiecePoints()
+    val = blend(board.mg, board.eg, board.phase)
+    if DEBUG_EVAL:
+        full = blend(*score_terms(board))
+        assert val == full, f"incremental evaluation {val} != full evaluation {full}"
     return val
 
 
+def attacked(board, x, y, color):
+    """
+    Returns true if a piece of color attacks the square (x, y)
+    """
+    for rays, sliders in ((ROOK_RAYS, ('Rook', 'Queen')), (BISHOP_RAYS, ('Bishop', 'Queen'))):
+        for ray in rays[x][y]:
+            for p in ray:
+                target = board[p.x][p.y]
+                if target != EMPTY:
+                    if target.color == color and target.name in sliders:
+                        return True
+                    break
+    for targets, name in ((KNIGHT_TARGETS, 'Knight'), (KING_TARGETS, 'King')):
+        for p in targets[x][y]:
+            target = board[p.x][p.y]
+            if target != EMPTY and target.color == color and target.name == name:
+                return True
+    # Black pawns capture towards higher rows, white pawns towards lower rows
+    row = x - 1 if color == BLACK else x + 1
+    if 0 <= row <= 7:
+        for col in (y - 1, y + 1):
+            if 0 <= col <= 7:
+                target = board[row][col]
+                if target != EMPTY and target.color == color and target.name == 'Pawn':
+                    return True
+    return False
+
+
+def in_check(board, color):
+    """
+    Returns true if the king of color is attacked
+    """
+    king = board.kings[color]
+    return king is not None and attacked(board, king.pos.x, king.pos.y, BLACK if color == WHITE else WHITE)
+
+
+def checks_and_pins(board, color):
+    """
+    Looks along the lines through the king of color once, for the legal move generation.
+    Returns (checkers, evasions, pins): the number of enemy pieces giving check, the squares (x * 8 + y)
+    a move other than a king move must go to while in single check (the checker and the squares between
+    it and the king), and for every pinned piece the squares it may move to without uncovering the king.
+    """
+    king = board.kings[color]
+    kx, ky = king.pos.x, king.pos.y
+    checkers = 0
+    evasions = set()
+    pins = {}
+    for rays, sliders in ((ROOK_RAYS, ('Rook', 'Queen')), (BISHOP_RAYS, ('Bishop', 'Queen'))):
+        for ray in rays[kx][ky]:
+            pinned = None
+            line = []
+            for p in ray:
+                line.append(p.x * 8 + p.y)
+                target = board[p.x][p.y]
+                if target == EMPTY:
+                    continue
+                if target.color == color:
+                    if pinned is not None:
+                        break
+                    pinned = target
+                    continue
+                if target.name in sliders:
+                    if pinned is None:
+                        checkers += 1
+                        evasions.update(line)
+                    else:
+                        pins[pinned] = set(line)
+                break
+    for p in KNIGHT_TARGETS[kx][ky]:
+        target = board[p.x][p.y]
+        if target != EMPTY and target.color != color and target.name == 'Knight':
+            checkers += 1
+            evasions.add(p.x * 8 + p.y)
+    row = kx - 1 if color == WHITE else kx + 1
+    if 0 <= row <= 7:
+        for col in (ky - 1, ky + 1):
+            if 0 <= col <= 7:
+                target = board[row][col]
+                if target != EMPTY and target.color != color and target.name == 'Pawn':
+                    checkers += 1
+                    evasions.add(row * 8 + col)
+    return checkers, evasions, pins
+
+
+def stage_actions(board, piece, stage):
+    """
+    Returns the moves of the piece in the stage (ALL_MOVES, CAPTURES or QUIET_MOVES), ignoring checks
+    """
+    if stage == CAPTURES:
+        return piece.captures(board)
+    mvs = piece.actions(board)
+    if stage == QUIET_MOVES:
+        return [mv for mv in mvs if board[mv.x][mv.y] == EMPTY]
+    return mvs
+
+
+def legal_moves(board, color, stage=ALL_MOVES, checks=None):
+    """
+    Returns the legal moves of all the pieces of color as list of (piece, list of Point) tuples:
+    the moves of the pieces which do not leave their own king attacked.
+    Checks and pins are found once, so only king moves need a test of their target square.
+    stage: ALL_MOVES, CAPTURES or QUIET_MOVES, the moves returned
+    checks: checks_and_pins(board, color) when it is already known
+    """
+    king = board.kings[color]
+    if king is None:
+        return [(piece, stage_actions(board, piece, stage)) for piece in board.pieces[color]]
+    enemy = BLACK if color == WHITE else WHITE
+    checkers, evasions, pins = checks if checks is not None else checks_and_pins(board, color)
+    result = []
+    for piece in board.pieces[color]:
+        if piece is king:
+            # Lift the king, so the squares behind it along a checking line count as attacked
+            mvs = stage_actions(board, piece, stage)
+            board[king.pos.x][king.pos.y] = EMPTY
+            mvs = [mv for mv in mvs if not attacked(board, mv.x, mv.y, enemy)]
+            board[king.pos.x][king.pos.y] = king
+        elif checkers > 1:
+            mvs = []
+        else:
+            mvs = stage_actions(board, piece, stage)
+            if checkers:
+                mvs = [mv for mv in mvs if mv.x * 8 + mv.y in evasions]
+            if piece in pins:
+                mvs = [mv for mv in mvs if mv.x * 8 + mv.y in pins[piece]]
+        result.append((piece, mvs))
+    return result
+
+
+def staged_moves(board, color):
+    """
+    Yields the legal moves of color in two stages, the captures and then the quiet moves, each as list of
+    (piece, list of Point) tuples like legal_moves. A stage is generated only when it is asked for, so a search
+    which is done after the captures never generates the quiet moves; checks and pins are found once for both.
+    The board must be the same position whenever the next stage is asked for.
+    """
+    checks = checks_and_pins(board, color) if board.kings[color] is not None else None
+    yield legal_moves(board, color, CAPTURES, checks)
+    yield legal_moves(board, color, QUIET_MOVES, checks)
+
+
+def legal_move(board, color, mid):
+    """
+    Returns the piece and the Point class object of the move with the given move_id if it is a legal move
+    of color, None otherwise. Checks a stored move, like the hash move, without generating all the moves.
+    """
+    frm, to = divmod(mid, 64)
+    piece = board[frm // 8][frm % 8]
+    if piece == EMPTY or piece.color != color:
+        return None
+    mv = Point(to // 8, to % 8)
+    if mv not in piece.actions(board):
+        return None
+    undo = make_move(board, piece, mv)
+    legal = not in_check(board, color)
+    unmake_move(board, undo)
+    return (piece, mv) if legal else None
+
+
+def legal_actions(board, piece):
+    """
+    Returns the legal moves of one piece
+    """
+    for other, mvs in legal_moves(board, piece.color):
+        if other is piece:
+            return mvs
+    return []
+
+
 def all_available_black_moves(board): 
     """
-    Returns available moves for all black pieces in the form of list of tuples,
+    Returns the legal moves for all black pieces in the form of list of tuples,
     where each tuple contains the piece name and the moves available for the piece.
     """
-    res = []
-    for i in range(8):
-        for j in range(8):
-            if board[i][j] != EMPTY and board[i][j].color == BLACK:
-                all_actions = (board[i][j], board[i][j].actions(board))
-                res.append(all_actions)
-    return res         
+    return legal_moves(board, BLACK)
 
 
 def all_available_white_moves(board): 
     """
-    Returns available moves for all white pieces in the form of list of tuples,
+    Returns the legal moves for all white pieces in the form of list of tuples,
     where each tuple contains the piece name and the moves available for the piece.
     """
-    res = []
-    for i in range(8):
-        for j in range(8):
-            if board[i][j] != EMPTY and board[i][j].color == WHITE:
-                all_actions = (board[i][j], board[i][j].actions(board))
-                res.append(all_actions)
-    return res        
+    return legal_moves(board, WHITE)
 
 
 def terminal(board): 
     """
-    Returns true if any king is dead
+    Returns true if any king is dead, which only happens in positions set up without one
     """
-    count = 0
-    for i in range(8):
-        for j in range(8):
-            if board[i][j] != EMPTY and board[i][j].name == 'King' and board[i][j].alive:
-                count += 1
-    return count != 2
+    return board.kings[BLACK] is None or board.kings[WHITE] is None
+
+
+def game_over(board):
+    """
+    Returns true if the side to move has no legal move (checkmate or stalemate), or a king is dead
+    """
+    return terminal(board) or not any(mvs for _, mvs in legal_moves(board, board.turn))
 
 
 def winner(board): 
     """
-    Returns the winner of the game
+    Returns the winner of the game, None while it goes on or if it is drawn
     """
     if terminal(board):
-        for i in range(8):
-            for j in range(8):
-                if board[i][j] != EMPTY and board[i][j].name == 'King' and board[i][j].alive:
-                        return board[i][j].color
+        for king in board.kings.values():
+            if king is not None:
+                return king.color
+    elif game_over(board) and in_check(board, board.turn):
+        return BLACK if board.turn == WHITE else WHITE
+
+
+def stalemate(board):
+    """
+    Returns true if the side to move has no legal move but is not in check, which draws the game
+    """
+    return not terminal(board) and game_over(board) and not in_check(board, board.turn)
     
 
 def display(state): 
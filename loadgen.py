@@ -0,0 +1,150 @@
+"""
+Load generator for the game server
+
+Simulates many clients playing against server.py at once. Each client connects, plays its games with random
+legal moves (a random color per game) and measures the time from sending a move to receiving the engine move.
+A move answered with 'busy' is sent again after a random, exponentially growing backoff. At the end the client
+side latency percentiles, the throughput and the server's own metrics are printed.
+
+    python server.py --workers 4 --movetime 0.1 &
+    python loadgen.py --clients 200 --games 2 --plies 20 --movetime 0.05
+"""
+from game import WHITE, BLACK, game_init, move, legal_moves, game_over
+from server import percentiles
+from uci import move_name, parse_move
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# Seconds a client waits before sending a move answered with 'busy' again, doubled on every retry up to MAX_BACKOFF
+BACKOFF = 0.05
+MAX_BACKOFF = 2.0
+
+
+class LoadStats:
+    def __init__(self):
+        self.latency = []
+        self.moves = 0
+        self.games = 0
+        self.busy = 0
+        self.errors = 0
+        self.failed_clients = 0
+
+
+async def request(reader, writer, line, stats, rng):
+    """
+    Sends one command and returns its reply, sending it again while the server answers busy
+    """
+    backoff = BACKOFF
+    while True:
+        writer.write((line + '\n').encode())
+        await writer.drain()
+        reply = (await reader.readline()).decode().strip()
+        if not reply:
+            raise ConnectionError("connection closed by the server")
+        if reply != 'busy':
+            return reply
+        stats.busy += 1
+        # Exponential backoff with jitter, so busy clients do not all come back at once
+        await asyncio.sleep(rng.uniform(backoff / 2, backoff))
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+async def play(reader, writer, plies, movetime, stats, rng):
+    """
+    Plays one game of at most plies client moves with random legal moves
+    """
+    player = rng.choice((WHITE, BLACK))
+    board = game_init(player)[0]
+    start = time.monotonic()
+    reply = await request(reader, writer, f"new {'white' if player == WHITE else 'black'} movetime {movetime}", stats, rng)
+    for _ in range(plies + 1):
+        words = reply.split()
+        if words[0] == 'engine':
+            stats.latency.append(time.monotonic() - start)
+            move(board, *parse_move(board, words[1]))
+        elif words[0] == 'error':
+            stats.errors += 1
+            return
+        if 'result' in words or game_over(board):
+            break
+        choices = [(piece, mv) for piece, mvs in legal_moves(board, board.turn) for mv in mvs]
+        piece, mv = rng.choice(choices)
+        name = move_name(piece, mv)
+        move(board, piece, mv)
+        stats.moves += 1
+        start = time.monotonic()
+        reply = await request(reader, writer, f"move {name}", stats, rng)
+    stats.games += 1
+
+
+async def client(number, args, stats):
+    rng = random.Random(args.seed * 100003 + number)
+    # Spread the connections over the ramp up time
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    try:
+        if args.unix:
+            reader, writer = await asyncio.open_unix_connection(args.unix)
+        else:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError:
+        stats.failed_clients += 1
+        return
+    try:
+        for _ in range(args.games):
+            await play(reader, writer, args.plies, args.movetime, stats, rng)
+        writer.write(b'quit\n')
+        await writer.drain()
+    except ConnectionError:
+        stats.failed_clients += 1
+    finally:
+        writer.close()
+
+
+async def server_stats(args):
+    """
+    Returns the metrics of the server as a dict
+    """
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    writer.write(b'stats\nquit\n')
+    await writer.drain()
+    reply = (await reader.readline()).decode()
+    writer.close()
+    return json.loads(reply.split(' ', 1)[1])
+
+
+async def run(args):
+    stats = LoadStats()
+    start = time.monotonic()
+    await asyncio.gather(*(client(number, args, stats) for number in range(args.clients)))
+    seconds = time.monotonic() - start
+    latency = {key: f"{1000 * value:.1f}ms" for key, value in percentiles(stats.latency).items()}
+    print(f"{args.clients} clients, {stats.games} games, {stats.moves} moves in {seconds:.1f}s "
+          f"({stats.moves / seconds:.1f} moves/s), {stats.busy} busy replies, {stats.errors} errors, "
+          f"{stats.failed_clients} clients failed")
+    print("engine move latency: " + (', '.join(f"{key} {value}" for key, value in latency.items()) or 'none'))
+    print("server: " + json.dumps(await server_stats(args)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many clients playing against the game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="connect to this Unix socket instead of TCP")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--games', type=int, default=1, help="games played by every client")
+    parser.add_argument('--plies', type=int, default=20, help="most client moves per game")
+    parser.add_argument('--movetime', type=float, default=0.1, metavar='SECONDS', help="engine time per move asked for")
+    parser.add_argument('--ramp', type=float, default=2.0, metavar='SECONDS', help="time over which the clients connect")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
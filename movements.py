@@ -2,231 +2,164 @@ from point import Point
 
 EMPTY = '.'
 
-def one_step_front(board, cur_pos:Point('x', 'y'), color):
-    if 0 <= cur_pos.x + 1 <= 7:
-        if board[cur_pos.x + 1][cur_pos.y] == EMPTY or board[cur_pos.x + 1][cur_pos.y].color != color:
-                return [Point(cur_pos.x + 1, cur_pos.y)]
-
-def one_step_back(board, cur_pos:Point('x', 'y'), color):
-    if 0 <= cur_pos.x - 1 <= 7:
-        if board[cur_pos.x - 1][cur_pos.y] == EMPTY or board[cur_pos.x - 1][cur_pos.y].color != color:
-            return [Point(cur_pos.x - 1, cur_pos.y)]
+# Directions as (row step, column step)
+FRONT = (1, 0)
+BACK = (-1, 0)
+RIGHT = (0, 1)
+LEFT = (0, -1)
+DIAG_RIGHT_FORWARD = (1, 1)
+DIAG_RIGHT_BACKWARD = (-1, 1)
+DIAG_LEFT_FORWARD = (1, -1)
+DIAG_LEFT_BACKWARD = (-1, -1)
+L_FRONT_STEPS = ((1, 2), (1, -2), (2, 1), (2, -1))
+L_BACK_STEPS = ((-1, 2), (-1, -2), (-2, 1), (-2, -1))
+
+
+def _ray(x, y, dx, dy):
+    """
+    Returns the points from (x, y) towards (dx, dy) up to the edge of the board, nearest first
+    """
+    points = []
+    x += dx
+    y += dy
+    while 0 <= x <= 7 and 0 <= y <= 7:
+        points.append(Point(x, y))
+        x += dx
+        y += dy
+    return points
 
 
-def front(board, cur_pos:Point('x', 'y'), color): 
+def _table(build):
     """
-    Takes current position as input and returns available forward moves 
+    Returns 8 * 8 table with build(x, y) for every square
     """
-    moves = []
-    for i in range(cur_pos.x + 1, 8):
-        moves.append(Point(i, cur_pos.y))
-        if board[i][cur_pos.y] != EMPTY:
-            if board[i][cur_pos.y].color == color:
-                moves.pop()
-            break
-    return moves
+    return [[build(x, y) for y in range(8)] for x in range(8)]
+
+
+# Rays for every square and direction, built once at import time.
+# RAYS[direction][x][y] is the list of points from (x, y) in that direction, nearest first.
+# The points are shared between calls, so they must never be modified.
+RAYS = {d: _table(lambda x, y, d=d: _ray(x, y, *d)) for d in (FRONT, BACK, RIGHT, LEFT, DIAG_RIGHT_FORWARD,
+                                                                DIAG_RIGHT_BACKWARD, DIAG_LEFT_FORWARD, DIAG_LEFT_BACKWARD)}
+# Single step target of every square and direction, None if it falls off the board
+STEPS = {d: _table(lambda x, y, d=d: RAYS[d][x][y][0] if RAYS[d][x][y] else None) for d in RAYS}
+L_FRONT_TARGETS = _table(lambda x, y: [p for dx, dy in L_FRONT_STEPS for p in _ray(x, y, dx, dy)[:1]])
+L_BACK_TARGETS = _table(lambda x, y: [p for dx, dy in L_BACK_STEPS for p in _ray(x, y, dx, dy)[:1]])
 
+# Rays and targets per piece, in the order their moves are generated
+ROOK_RAYS = _table(lambda x, y: [RAYS[d][x][y] for d in (FRONT, BACK, RIGHT, LEFT) if RAYS[d][x][y]])
+BISHOP_RAYS = _table(lambda x, y: [RAYS[d][x][y] for d in (DIAG_RIGHT_FORWARD, DIAG_RIGHT_BACKWARD,
+                                                              DIAG_LEFT_FORWARD, DIAG_LEFT_BACKWARD) if RAYS[d][x][y]])
+QUEEN_RAYS = _table(lambda x, y: [RAYS[d][x][y] for d in (FRONT, BACK, RIGHT, LEFT, DIAG_RIGHT_BACKWARD, DIAG_RIGHT_FORWARD,
+                                                             DIAG_LEFT_FORWARD, DIAG_LEFT_BACKWARD) if RAYS[d][x][y]])
+KNIGHT_TARGETS = _table(lambda x, y: L_FRONT_TARGETS[x][y] + L_BACK_TARGETS[x][y])
+KING_TARGETS = _table(lambda x, y: [STEPS[d][x][y] for d in (FRONT, BACK, RIGHT, LEFT, DIAG_RIGHT_FORWARD, DIAG_RIGHT_BACKWARD,
+                                                              DIAG_LEFT_BACKWARD, DIAG_LEFT_FORWARD) if STEPS[d][x][y]])
+# Squares a pawn captures on from every square, black pawns towards higher rows
+PAWN_CAPTURE_TARGETS = {color: _table(lambda x, y, steps=steps: [STEPS[d][x][y] for d in steps if STEPS[d][x][y]])
+                        for color, steps in (('B', (DIAG_RIGHT_FORWARD, DIAG_LEFT_FORWARD)),
+                                             ('W', (DIAG_RIGHT_BACKWARD, DIAG_LEFT_BACKWARD)))}
 
-def back(board, cur_pos:Point('x', 'y'), color):
+
+def slide(board, rays, color):
     """
-    Takes current position as input and returns available backward moves 
+    Returns the points along the rays up to the first piece, including it if it is an enemy
     """
     moves = []
-    for i in range(cur_pos.x - 1, -1, -1):
-        moves.append(Point(i, cur_pos.y))
-        if board[i][cur_pos.y] != EMPTY:
-            if board[i][cur_pos.y].color == color:
-                moves.pop()
-            break
+    for ray in rays:
+        for p in ray:
+            target = board[p.x][p.y]
+            if target == EMPTY:
+                moves.append(p)
+            else:
+                if target.color != color:
+                    moves.append(p)
+                break
     return moves
 
 
-def one_step_right(board, cur_pos:Point('x', 'y'), color):
-    if 0 <= cur_pos.y + 1 <= 7:
-        if board[cur_pos.x][cur_pos.y + 1] == EMPTY or board[cur_pos.x][cur_pos.y + 1].color != color:
-            return [Point(cur_pos.x, cur_pos.y + 1)]
-
-
-def one_step_left(board, cur_pos:Point('x', 'y'), color):
-    if 0 <= cur_pos.y - 1 <= 7:
-        if board[cur_pos.x][cur_pos.y - 1] == EMPTY or board[cur_pos.x][cur_pos.y - 1].color != color:
-            return [Point(cur_pos.x, cur_pos.y - 1)]
-
-
-def right(board, cur_pos:Point('x', 'y'), color):
+def jump(board, targets, color):
     """
-    Takes current position as input and returns available right-side moves 
+    Returns the targets which are empty or hold an enemy piece
     """
-    moves = []
-    for i in range(cur_pos.y + 1, 8):
-        moves.append(Point(cur_pos.x, i))
-        if board[cur_pos.x][i] != EMPTY:
-            if board[cur_pos.x][i].color == color:
-                moves.pop()
-            break
-    return moves
+    return [p for p in targets if board[p.x][p.y] == EMPTY or board[p.x][p.y].color != color]
 
 
-def left(board, cur_pos:Point('x', 'y'), color):
+def slide_captures(board, rays, color):
     """
-    Takes current position as input and returns available left-side moves 
+    Returns the first piece along each of the rays if it is an enemy, the captures among the points of slide
     """
     moves = []
-    for i in range(cur_pos.y - 1, -1, -1):
-        moves.append(Point(cur_pos.x, i))
-        if board[cur_pos.x][i] != EMPTY:
-            if board[cur_pos.x][i].color == color:
-                moves.pop()
-            break
+    for ray in rays:
+        for p in ray:
+            target = board[p.x][p.y]
+            if target != EMPTY:
+                if target.color != color:
+                    moves.append(p)
+                break
     return moves
 
 
-def one_step_diag_right_forward(board, cur_pos:Point('x', 'y'), color):
-    x = cur_pos.x + 1
-    y = cur_pos.y + 1
-    if 0 <= x <= 7 and 0 <= y <= 7:
-        if board[x][y] == EMPTY or board[x][y].color != color:
-            return [Point(x, y)]
+def jump_captures(board, targets, color):
+    """
+    Returns the targets which hold an enemy piece
+    """
+    return [p for p in targets if board[p.x][p.y] != EMPTY and board[p.x][p.y].color != color]
 
 
-def diag_right_forward(board, cur_pos:Point('x', 'y'), color):
+def rook_moves(board, cur_pos:Point('x', 'y'), color):
     """
-    Takes current position as input and returns available diagonally-right-side-forward moves 
+    Takes current position as input and returns available rook moves
     """
-    moves = []
-    x = cur_pos.x + 1
-    y = cur_pos.y + 1
-    while 0 <= x <= 7 and 0 <= y <= 7:
-        moves.append(Point(x, y))
-        if board[x][y] != EMPTY:
-            if board[x][y].color == color:
-                moves.pop()
-            break
-        x += 1
-        y += 1
-    return moves
+    return slide(board, ROOK_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def one_step_diag_right_backward(board, cur_pos:Point('x', 'y'), color):
-    x = cur_pos.x - 1
-    y = cur_pos.y + 1
-    if 0 <= x <= 7 and 0 <= y <= 7:
-        if board[x][y] == EMPTY or board[x][y].color != color:
-            return [Point(x, y)]
+def bishop_moves(board, cur_pos:Point('x', 'y'), color):
+    """
+    Takes current position as input and returns available bishop moves
+    """
+    return slide(board, BISHOP_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def diag_right_backward(board, cur_pos:Point('x', 'y'), color):
+def queen_moves(board, cur_pos:Point('x', 'y'), color):
     """
-    Takes current position as input and returns available diagonally-right-side-backward moves 
+    Takes current position as input and returns available queen moves
     """
-    moves = []
-    x = cur_pos.x - 1
-    y = cur_pos.y + 1
-    while 0 <= x <= 7 and 0 <= y <= 7:
-        moves.append(Point(x, y))
-        if board[x][y] != EMPTY:
-            if board[x][y].color == color:
-                moves.pop()
-            break
-        x -= 1
-        y += 1
-    return moves
+    return slide(board, QUEEN_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def one_step_diag_left_forward(board, cur_pos:Point('x', 'y'), color):
-    x = cur_pos.x + 1
-    y = cur_pos.y - 1
-    if 0 <= x <= 7 and 0 <= y <= 7:
-        if board[x][y] == EMPTY or board[x][y].color != color:
-            return [Point(x, y)]
+def knight_moves(board, cur_pos:Point('x', 'y'), color):
+    """
+    Takes current position as input and returns available knight moves
+    """
+    return jump(board, KNIGHT_TARGETS[cur_pos.x][cur_pos.y], color)
 
 
-def diag_left_forward(board, cur_pos:Point('x', 'y'), color):
+def king_moves(board, cur_pos:Point('x', 'y'), color):
     """
-    Takes current position as input and returns available diagonally-left-side-forward moves 
+    Takes current position as input and returns available king moves
     """
-    moves = []
-    x = cur_pos.x + 1
-    y = cur_pos.y - 1
-    while 0 <= x <= 7 and 0 <= y <= 7:
-        moves.append(Point(x, y))
-        if board[x][y] != EMPTY:
-            if board[x][y].color == color:
-                moves.pop()
-            break
-        x += 1
-        y -= 1
-    return moves
+    return jump(board, KING_TARGETS[cur_pos.x][cur_pos.y], color)
 
 
-def one_step_diag_left_backward(board, cur_pos:Point('x', 'y'), color):
-    x = cur_pos.x - 1
-    y = cur_pos.y - 1
-    if 0 <= x <= 7 and 0 <= y <= 7:
-        if board[x][y] == EMPTY or board[x][y].color != color:
-            return [Point(x, y)]
+def rook_captures(board, cur_pos:Point('x', 'y'), color):
+    return slide_captures(board, ROOK_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def diag_left_backward(board, cur_pos:Point('x', 'y'), color):
-    """
-    Takes current position as input and returns available diagonally-left-side-backward moves 
-    """
-    moves = []
-    x = cur_pos.x - 1
-    y = cur_pos.y - 1
-    while 0 <= x <= 7 and 0 <= y <= 7:
-        moves.append(Point(x, y))
-        if board[x][y] != EMPTY:
-            if board[x][y].color == color:
-                moves.pop()
-            break
-        x -= 1
-        y -= 1
-    return moves
+def bishop_captures(board, cur_pos:Point('x', 'y'), color):
+    return slide_captures(board, BISHOP_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def L_front(board, cur_pos:Point('x', 'y'), color):
-    """
-    Takes current position as input and returns available L-shape forward moves 
-    """
-    moves = []
-    if 0 <= cur_pos.x + 1 <= 7:
-        if 0 <= cur_pos.y + 2 <= 7:
-            if board[cur_pos.x + 1][cur_pos.y + 2] == EMPTY or board[cur_pos.x + 1][cur_pos.y + 2].color != color:
-                moves.append(Point(cur_pos.x + 1, cur_pos.y + 2))
-        if 0 <= cur_pos.y - 2 <= 7:
-            if board[cur_pos.x + 1][cur_pos.y - 2] == EMPTY or board[cur_pos.x + 1][cur_pos.y - 2].color != color:
-                moves.append(Point(cur_pos.x + 1, cur_pos.y - 2)) 
-    if 0 <= cur_pos.x + 2 <= 7:
-        if 0 <= cur_pos.y + 1 <= 7:
-            if board[cur_pos.x + 2][cur_pos.y + 1] == EMPTY or board[cur_pos.x + 2][cur_pos.y + 1].color != color:
-                moves.append(Point(cur_pos.x + 2, cur_pos.y + 1))
-        if 0 <= cur_pos.y - 1 <= 7:
-            if board[cur_pos.x + 2][cur_pos.y - 1] == EMPTY or board[cur_pos.x + 2][cur_pos.y - 1].color != color:
-                moves.append(Point(cur_pos.x + 2, cur_pos.y - 1))
-    return moves
+def queen_captures(board, cur_pos:Point('x', 'y'), color):
+    return slide_captures(board, QUEEN_RAYS[cur_pos.x][cur_pos.y], color)
 
 
-def L_back(board, cur_pos:Point('x', 'y'), color):
-    """
-    Takes current position as input and returns available L-shape backward moves 
-    """
-    moves = []
-    if 0 <= cur_pos.x - 1 <= 7:
-        if 0 <= cur_pos.y + 2 <= 7:
-            if board[cur_pos.x - 1][cur_pos.y + 2] == EMPTY or board[cur_pos.x - 1][cur_pos.y + 2].color != color:
-                moves.append(Point(cur_pos.x - 1, cur_pos.y + 2))
-        if 0 <= cur_pos.y - 2 <= 7:
-            if board[cur_pos.x - 1][cur_pos.y - 2] == EMPTY or board[cur_pos.x - 1][cur_pos.y - 2].color != color:
-                moves.append(Point(cur_pos.x - 1, cur_pos.y - 2)) 
-    if 0 <= cur_pos.x - 2 <= 7:
-        if 0 <= cur_pos.y + 1 <= 7:
-            if board[cur_pos.x - 2][cur_pos.y + 1] == EMPTY or board[cur_pos.x - 2][cur_pos.y + 1].color != color:
-                moves.append(Point(cur_pos.x - 2, cur_pos.y + 1))
-        if 0 <= cur_pos.y - 1 <= 7:
-            if board[cur_pos.x - 2][cur_pos.y - 1] == EMPTY or board[cur_pos.x - 2][cur_pos.y - 1].color != color:
-                moves.append(Point(cur_pos.x - 2, cur_pos.y - 1))
-    return moves
+def knight_captures(board, cur_pos:Point('x', 'y'), color):
+    return jump_captures(board, KNIGHT_TARGETS[cur_pos.x][cur_pos.y], color)
+
+
+def king_captures(board, cur_pos:Point('x', 'y'), color):
+    return jump_captures(board, KING_TARGETS[cur_pos.x][cur_pos.y], color)
 
 
 # Special rules for pawns:
@@ -254,4 +187,11 @@ def pawn_rules(board, cur_pos, color, init):
                 available_moves.append(Point(cur_pos.x - 1, cur_pos.y + 1))
             if 0 <= cur_pos.y - 1 <= 7 and board[cur_pos.x - 1][cur_pos.y - 1] != EMPTY and board[cur_pos.x - 1][cur_pos.y - 1].color != color:
                 available_moves.append(Point(cur_pos.x - 1, cur_pos.y - 1))
-    return available_moves
\ No newline at end of file
+    return available_moves
+
+
+def pawn_captures(board, cur_pos, color):
+    """
+    Returns the diagonal captures of a pawn, in the order pawn_rules returns them
+    """
+    return jump_captures(board, PAWN_CAPTURE_TARGETS[color][cur_pos.x][cur_pos.y], color)
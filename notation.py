@@ -0,0 +1,148 @@
+"""
+Conversions between boards and text notations
+Row 0 of the board is black's back rank (rank 8) and column 0 is file a.
+"""
+from game import Board, Piece, BLACK, WHITE, EMPTY, all_available_black_moves, all_available_white_moves
+from game import make_move, unmake_move, in_check, game_over
+from point import Point
+
+FEN_NAMES = {'p': 'Pawn', 'n': 'Knight', 'b': 'Bishop', 'r': 'Rook', 'q': 'Queen', 'k': 'King'}
+FEN_LETTERS = {name: letter for letter, name in FEN_NAMES.items()}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
+
+def square_name(x, y):
+    """
+    Returns the algebraic name of the square at row x and column y, 'e2' for (6, 4)
+    """
+    return 'abcdefgh'[y] + str(8 - x)
+
+
+def parse_square(name):
+    """
+    Returns (x, y) of the square with the algebraic name, (6, 4) for 'e2'
+    """
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f"invalid square {name!r}")
+    return 8 - int(name[1]), 'abcdefgh'.index(name[0])
+
+
+def board_from_fen(fen):
+    """
+    Builds a board from a FEN string. Castling rights, en passant square and move counters are ignored.
+    Pieces are named in board order ('Pawn-1', 'Pawn-2', ..., 'Rook-1', ...) like game_init does.
+    Pawns on their starting row have not moved yet, so they may make the two-step move.
+    """
+    fields = fen.split()
+    rows = fields[0].split('/')
+    if len(rows) != 8:
+        raise ValueError(f"invalid FEN {fen!r}: expected 8 rows")
+    board = [[EMPTY for _ in range(8)] for _ in range(8)]
+    counts = {}
+    for x, row in enumerate(rows):
+        y = 0
+        for char in row:
+            if char.isdigit():
+                y += int(char)
+                continue
+            if char.lower() not in FEN_NAMES or y > 7:
+                raise ValueError(f"invalid FEN {fen!r}: bad row {row!r}")
+            color = WHITE if char.isupper() else BLACK
+            name = FEN_NAMES[char.lower()]
+            if name != 'King' and name != 'Queen':
+                counts[color, name] = counts.get((color, name), 0) + 1
+                name = f"{name}-{counts[color, name]}"
+            piece = Piece(name, (x, y), color)
+            if piece.name == 'Pawn':
+                piece.init = x != (1 if color == BLACK else 6)
+            board[x][y] = piece
+            y += 1
+        if y != 8:
+            raise ValueError(f"invalid FEN {fen!r}: bad row {row!r}")
+    turn = fields[1] if len(fields) > 1 else 'w'
+    if turn not in ('w', 'b'):
+        raise ValueError(f"invalid FEN {fen!r}: bad side to move {turn!r}")
+    return Board(board, WHITE if turn == 'w' else BLACK)
+
+
+def board_to_fen(board):
+    """
+    Returns the FEN string of the board, without castling rights or en passant square
+    """
+    rows = []
+    for row in board:
+        text = ''
+        empty = 0
+        for piece in row:
+            if piece == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            letter = FEN_LETTERS[piece.name]
+            text += letter.upper() if piece.color == WHITE else letter
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    return f"{'/'.join(rows)} {'w' if board.turn == WHITE else 'b'} - - 0 1"
+
+
+def parse_san(board, san):
+    """
+    Returns (piece, Point) of the move written in standard algebraic notation ('e4', 'Nxf3', 'R1e2', 'exd5+')
+    for the side to move. Castling, promotion and en passant are not moves of this engine and raise ValueError,
+    like an illegal or ambiguous move.
+    """
+    text = san.rstrip('+#!?')
+    if text.startswith('O-O') or text.startswith('0-0') or '=' in text:
+        raise ValueError(f"unsupported move {san!r}")
+    name = 'Pawn'
+    if text and text[0] in 'NBRQK':
+        name = FEN_NAMES[text[0].lower()]
+        text = text[1:]
+    to = parse_square(text[-2:])
+    hint = text[:-2].replace('x', '')
+    if len(hint) > 2 or any(char not in 'abcdefgh12345678' for char in hint):
+        raise ValueError(f"invalid move {san!r}")
+    moves = all_available_white_moves(board) if board.turn == WHITE else all_available_black_moves(board)
+    found = []
+    for piece, mvs in moves:
+        if piece.name != name or Point(*to) not in mvs:
+            continue
+        from_name = square_name(piece.pos.x, piece.pos.y)
+        if all(char in from_name for char in hint):
+            found.append(piece)
+    if len(found) != 1:
+        raise ValueError(f"{'ambiguous' if found else 'illegal'} move {san!r}")
+    return found[0], Point(*to)
+
+
+def move_to_san(board, piece, mv):
+    """
+    Returns the move of piece to the Point mv, for the side to move, in standard algebraic notation:
+    the piece letter, the file and/or rank of the piece if another piece of the same kind could move there too,
+    'x' for a capture, the target square and '+' for check or '#' for checkmate
+    """
+    to = square_name(mv.x, mv.y)
+    from_name = square_name(piece.pos.x, piece.pos.y)
+    capture = board[mv.x][mv.y] != EMPTY
+    if piece.name == 'Pawn':
+        san = (from_name[0] + 'x' if capture else '') + to
+    else:
+        moves = all_available_white_moves(board) if board.turn == WHITE else all_available_black_moves(board)
+        others = [other for other, mvs in moves if other is not piece and other.name == piece.name and mv in mvs]
+        hint = ''
+        if others:
+            if all(other.pos.y != piece.pos.y for other in others):
+                hint = from_name[0]
+            elif all(other.pos.x != piece.pos.x for other in others):
+                hint = from_name[1]
+            else:
+                hint = from_name
+        san = FEN_LETTERS[piece.name].upper() + hint + ('x' if capture else '') + to
+    undo = make_move(board, piece, mv)
+    if in_check(board, board.turn):
+        san += '#' if game_over(board) else '+'
+    unmake_move(board, undo)
+    return san
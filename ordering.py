@@ -0,0 +1,128 @@
+"""
+Move ordering for the alpha-beta search
+
+Alpha-beta prunes the most when the best move is searched first, so the moves of a node are tried in this order:
+  • the best move stored in the transposition table (hash move)
+  • captures, most valuable victim first and least valuable attacker first among equal victims (MVV-LVA)
+  • the two killer moves of the ply: quiet moves which caused a beta cutoff in a sibling node
+  • the other quiet moves, by their history score: how often and how deep they caused beta cutoffs in this search
+The search takes these as stages (runner.staged_moves): the hash move is tried before any move is generated,
+and the quiet moves are generated only if no capture caused a cutoff.
+"""
+from game import Points, BLACK, WHITE
+
+KILLER = 1 << 29
+# History scores are halved when one reaches this, so they never outrank a killer move
+HISTORY_LIMIT = 1 << 28
+MAX_PLY = 128
+
+
+def mvv_lva(victim, attacker):
+    """
+    Returns the MVV-LVA score of a capture from the names of the captured and capturing pieces
+    """
+    return Points[victim] * 100 - Points[attacker]
+
+
+class MoveOrdering:
+    def __init__(self):
+        # Two killer move ids per ply, the most recent first
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        # History score per color and move id (from square * 64 + to square)
+        self.history = {BLACK: [0] * 4096, WHITE: [0] * 4096}
+
+    def order(self, board, moves, color, ply, hint, backend):
+        """
+        Returns the moves grouped by piece as a flat list of (piece, move) pairs, best first
+        """
+        first = []
+        captures = []
+        quiets = []
+        for piece, mvs in moves:
+            for mv in mvs:
+                if backend.move_id(piece, mv) == hint:
+                    first.append((piece, mv))
+                elif backend.capture(board, piece, mv)[0] is not None:
+                    captures.append((piece, mv))
+                else:
+                    quiets.append((piece, mv))
+        return first + self.order_captures(board, captures, backend) + self.order_quiets(quiets, color, ply, backend)
+
+    def order_captures(self, board, captures, backend):
+        """
+        Returns the (piece, move) pairs of captures by MVV-LVA, best first
+        """
+        scored = [(mvv_lva(*backend.capture(board, piece, mv)), piece, mv) for piece, mv in captures]
+        # Stable, so moves with equal scores keep the generation order
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [(piece, mv) for _, piece, mv in scored]
+
+    def order_quiets(self, quiets, color, ply, backend):
+        """
+        Returns the (piece, move) pairs of quiet moves with the killer moves of the ply first, then by history
+        """
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history[color]
+        scored = []
+        for piece, mv in quiets:
+            mid = backend.move_id(piece, mv)
+            if mid == killers[0]:
+                score = KILLER
+            elif mid == killers[1]:
+                score = KILLER - 1
+            else:
+                score = history[mid]
+            scored.append((score, piece, mv))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [(piece, mv) for _, piece, mv in scored]
+
+    def cutoff(self, board, piece, mv, color, ply, depth, backend):
+        """
+        Records the move which caused a beta cutoff. Only quiet moves become killers and gain history.
+        """
+        if backend.capture(board, piece, mv)[0] is not None:
+            return
+        mid = backend.move_id(piece, mv)
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != mid:
+                killers[1] = killers[0]
+                killers[0] = mid
+        history = self.history[color]
+        history[mid] += depth * depth
+        if history[mid] >= HISTORY_LIMIT:
+            for table in self.history.values():
+                for i in range(len(table)):
+                    table[i] //= 2
+
+
+if __name__ == "__main__":
+    import math
+    import random
+    import sys
+    from game import game_init, move, all_available_black_moves, all_available_white_moves
+    from runner import SearchContext, minimize, maximize
+
+    # Node counts of a fixed depth search with and without move ordering on positions from seeded random games
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    random.seed(7)
+    totals = [0, 0]
+    for game_number in range(8):
+        board = game_init(WHITE)[0]
+        for ply in range(10 + 4 * game_number):
+            moves = all_available_white_moves(board) if board.turn == WHITE else all_available_black_moves(board)
+            choices = [(piece, mv) for piece, mvs in moves for mv in mvs]
+            if not choices:
+                break
+            move(board, *random.choice(choices))
+        search = maximize if board.turn == WHITE else minimize
+        counts = []
+        for ordering in (False, True):
+            ctx = SearchContext(ordering=ordering, null_move=False, lmr=False)
+            counts.append((search(board, depth, -math.inf, math.inf, ctx)[2], ctx.nodes))
+        (plain_score, plain), (ordered_score, ordered) = counts
+        assert plain_score == ordered_score
+        totals[0] += plain
+        totals[1] += ordered
+        print(f"position {game_number + 1}: {plain:>8} nodes unordered, {ordered:>8} ordered ({100 * ordered / plain:.0f}%)")
+    print(f"total: {totals[0]:>8} nodes unordered, {totals[1]:>8} ordered ({100 * totals[1] / totals[0]:.0f}%)")
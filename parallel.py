@@ -0,0 +1,257 @@
+"""
+Parallel root search
+
+The root moves are spread over a pool of worker processes, each searching the position after one root move
+with its own search context. The best score found so far is shared between the workers through a
+multiprocessing.Value, so root moves searched later start with a narrower window and still get pruned.
+
+The best move is the one the serial alpha-beta search picks at the same depth: the first move, in root move
+order, whose exact score is the best score. A move which only returned a bound equal to the best score is
+searched again with the full window to tell whether it ties. This only holds while null move pruning and late
+move reductions are off, as they are by default: with them the score of a move depends on the window it is
+searched with, and the workers search with other windows than the serial search.
+
+Run this file to compare the serial search with the parallel one for several worker counts.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from game import WHITE
+from runner import SearchContext, SearchTimeout, MATE_BOUND, ordered_moves, minimize, maximize
+from stats import SearchStats
+from tablebase import Tablebases
+from transposition import TranspositionTable
+import importlib
+import math
+import multiprocessing
+import time
+
+# Worker process state, set up by _init_worker
+_best = None
+_tt = None
+_options = None
+# Number of the move search the transposition table was last aged for
+_search = None
+
+
+def _init_worker(best, hash_mb, tablebases, options):
+    global _best, _tt, _options
+    _best = best
+    _tt = TranspositionTable(hash_mb) if hash_mb > 0 else None
+    _options = dict(options, tablebases=Tablebases(tablebases) if tablebases else None)
+
+
+def _search_move(board, color, depth, index, mid, backend_name, deadline, max_nodes, collect_stats, search,
+                 full_window=False):
+    """
+    Searches the position after one root move in a worker process until the time.monotonic() deadline
+    or max_nodes nodes, None for no limit.
+    search: number of the move search, the transposition table is aged once for every new one
+    full_window: search with the full window instead of from the shared best score, and leave that score alone
+    Returns (index, score or None if the budget ran out, bound the search started from, nodes,
+    SearchStats or None if collect_stats is false).
+    The shared best score is kept from the view of the side to move: the score for white, minus the score for black.
+    """
+    global _search
+    if _tt is not None and search != _search:
+        _tt.new_search()
+        _search = search
+    if deadline is not None and time.monotonic() >= deadline:
+        # Waited in the queue past the deadline
+        return index, None, _best.value, 0, None
+    backend = importlib.import_module(backend_name)
+    stats = SearchStats() if collect_stats else None
+    ctx = SearchContext(backend, _tt, deadline, max_nodes, stats=stats, **_options)
+    start = time.monotonic()
+    piece, mv = backend.move_from_id(board, mid)
+    bound = -math.inf if full_window else _best.value
+    undo = backend.make_move(board, piece, mv)
+    ctx.ply = 1
+    value = None
+    try:
+        if color == WHITE:
+            value = minimize(board, depth - 1, bound, math.inf, ctx)[2]
+        else:
+            value = maximize(board, depth - 1, -math.inf, -bound, ctx)[2]
+    except SearchTimeout:
+        pass
+    finally:
+        backend.unmake_move(board, undo)
+    if stats is not None:
+        stats.nodes = ctx.nodes
+        stats.seconds = time.monotonic() - start
+    if value is not None and not full_window:
+        with _best.get_lock():
+            _best.value = max(_best.value, value if color == WHITE else -value)
+    return index, value, bound, ctx.nodes, stats
+
+
+class ParallelSearch:
+    def __init__(self, workers=None, hash_mb=16, backend='game', tablebases=None, pvs=True, null_move=False, lmr=False,
+                 batch_eval=False):
+        """
+        workers: number of worker processes, the number of CPUs if None
+        hash_mb: size of the transposition table of each worker in megabytes, 0 for none
+        backend: name of the backend module ('game' or 'bitboard')
+        tablebases: directory of the tablebases every worker opens, None for none
+        pvs, null_move, lmr, batch_eval: the SearchContext options of the searches
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.backend = importlib.import_module(backend)
+        self.options = {'pvs': pvs, 'null_move': null_move, 'lmr': lmr, 'batch_eval': batch_eval}
+        self.best = multiprocessing.Value('d', -math.inf)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.best, hash_mb, tablebases, self.options))
+        self.nodes = 0
+        # Move searches started, so the workers know when to age their tables
+        self.searches = 0
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def root_moves(self, board, color):
+        """
+        Returns the root moves in the order the serial search tries them
+        """
+        backend = self.backend
+        moves = backend.all_available_white_moves(board) if color == WHITE else backend.all_available_black_moves(board)
+        return ordered_moves(board, moves, color, None, SearchContext(backend))
+
+    def search_root(self, board, color, depth, root_moves, movetime=None, max_nodes=None, stats=None):
+        """
+        Searches the root moves to depth in parallel.
+        Returns (piece, move, score, scored) where scored is the list of (score, piece, move) in root move order.
+        Raises SearchTimeout if movetime seconds pass or the workers search more than max_nodes nodes together
+        before every root move is searched. All the workers share one deadline, so root moves still queued when
+        it passes are not searched, and each root move may search at most its worker's share of max_nodes.
+        stats: SearchStats the counts and timings of the workers are added to, None to collect nothing
+        """
+        backend = self.backend
+        self.best.value = -math.inf
+        deadline = time.monotonic() + movetime if movetime is not None else None
+        share = -(-max_nodes // self.workers) if max_nodes is not None else None
+        futures = []
+        for piece, mv in root_moves:
+            futures.append(self.pool.submit(_search_move, board, color, depth, len(futures), backend.move_id(piece, mv),
+                                            backend.__name__, deadline, share, stats is not None, self.searches))
+        results = [None] * len(root_moves)
+        searched = 0
+        timed_out = False
+        for future in futures:
+            if timed_out:
+                # Drop the root moves which have not started, the running ones stop at the deadline
+                if future.cancel():
+                    continue
+            index, value, bound, nodes, worker_stats = future.result()
+            searched += nodes
+            if worker_stats is not None:
+                stats.add(worker_stats)
+            if value is None or (max_nodes is not None and searched > max_nodes):
+                timed_out = True
+            results[index] = (value, bound)
+        self.nodes += searched
+        if timed_out:
+            raise SearchTimeout
+
+        sign = 1 if color == WHITE else -1
+        best_score = max(sign * value for value, _ in results)
+        best_index = None
+        for index, (value, bound) in enumerate(results):
+            if sign * value != best_score:
+                continue
+            if sign * value > bound or bound == -math.inf:
+                best_index = index
+                break
+            # Only a bound equal to the best score: the true score may be lower
+            nodes_left = max_nodes - searched if max_nodes is not None else None
+            exact, nodes = self._full_window(board, color, depth, root_moves[index], deadline, nodes_left, stats)
+            searched += nodes
+            if exact == value:
+                best_index = index
+                break
+        piece, mv = root_moves[best_index]
+        scored = [(value, piece, mv) for (value, _), (piece, mv) in zip(results, root_moves)]
+        return piece, mv, sign * best_score, scored
+
+    def _full_window(self, board, color, depth, root_move, deadline, max_nodes, stats):
+        """
+        Searches one root move again with the full window on a worker, within the deadline and node budget
+        of the iteration. Returns (score, nodes). Raises SearchTimeout if the budget runs out.
+        """
+        backend = self.backend
+        future = self.pool.submit(_search_move, board, color, depth, 0, backend.move_id(*root_move), backend.__name__,
+                                  deadline, max_nodes, stats is not None, self.searches, True)
+        _, value, _, nodes, worker_stats = future.result()
+        self.nodes += nodes
+        if worker_stats is not None:
+            stats.add(worker_stats)
+        if value is None:
+            raise SearchTimeout
+        return value, nodes
+
+    def iterative_deepening(self, board, color, movetime=None, max_nodes=None, max_depth=64, stats=None):
+        """
+        Same as runner.iterative_deepening, with every iteration searched in parallel.
+        Returns (piece, move, score, depth) of the last completed depth, (None, None, None, 0) if there are no moves.
+        stats: SearchStats collecting the counts of all the workers; its times are summed over the workers
+        """
+        start = time.monotonic()
+        start_nodes = self.nodes
+        self.searches += 1
+        if self.backend.terminal(board):
+            return None, None, None, 0
+        root_moves = self.root_moves(board, color)
+        if not root_moves:
+            return None, None, None, 0
+        best = (root_moves[0][0], root_moves[0][1], None, 0)
+        for depth in range(1, max_depth + 1):
+            left = movetime - (time.monotonic() - start) if movetime is not None else None
+            nodes_left = max_nodes - (self.nodes - start_nodes) if max_nodes is not None else None
+            try:
+                piece, mv, value, scored = self.search_root(board, color, depth, root_moves, left, nodes_left, stats)
+            except SearchTimeout:
+                break
+            best = (piece, mv, value, depth)
+            if stats is not None:
+                stats.iteration(depth, self.nodes - start_nodes, time.monotonic() - start, value)
+            # Best move first, then the others by score
+            scored.sort(key=lambda item: -item[0] if color == WHITE else item[0])
+            root_moves = [(piece, mv)] + [(p, m) for _, p, m in scored if (p, m) != (piece, mv)]
+            if abs(value) >= MATE_BOUND:
+                break
+        if stats is not None:
+            stats.nodes = self.nodes - start_nodes
+        return best
+
+
+if __name__ == "__main__":
+    import argparse
+    from game import game_init, BLACK
+
+    parser = argparse.ArgumentParser(description="Compare the serial and parallel root search")
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--hash', type=int, default=0, metavar='MB', help="transposition table of the searches (0 to compare exact results)")
+    args = parser.parse_args()
+
+    board = game_init(WHITE)[0]
+    for color, search in ((WHITE, maximize), (BLACK, minimize)):
+        ctx = SearchContext(tt=TranspositionTable(args.hash) if args.hash > 0 else None, null_move=False, lmr=False)
+        start = time.perf_counter()
+        piece, mv, value = search(board, args.depth, -math.inf, math.inf, ctx)
+        serial = time.perf_counter() - start
+        print(f"{color} to move, depth {args.depth}: serial {serial:.2f}s, {ctx.nodes} nodes, {piece.name} to {mv} ({value})")
+        for workers in args.workers:
+            with ParallelSearch(workers, args.hash) as parallel:
+                # Start the worker processes before timing
+                list(parallel.pool.map(abs, range(workers)))
+                start = time.perf_counter()
+                p_piece, p_mv, p_value, _ = parallel.search_root(board, color, args.depth, parallel.root_moves(board, color))
+                seconds = time.perf_counter() - start
+            same = p_piece is piece and p_mv == mv and p_value == value
+            print(f"  {workers:>2} workers: {seconds:.2f}s, speedup {serial / seconds:.2f}x, "
+                  f"{parallel.nodes} nodes, {'same move' if same else 'DIFFERENT MOVE'}")
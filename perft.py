@@ -0,0 +1,163 @@
+"""
+Perft: counts the leaf nodes of the move generation tree to a fixed depth
+
+The counts follow the rules of this engine: only legal moves, but no castling, en passant or promotion,
+so they match the standard counts of positions and depths where those moves do not occur.
+
+    python perft.py                       # start position to depth 4, with nodes per second
+    python perft.py --fen FEN --divide    # per root move breakdown
+    python perft.py --check               # compare with the reference counts in perft.epd
+    python perft.py --check --save-baseline speed.json   # remember the speed of this machine
+    python perft.py --check --baseline speed.json        # ... and fail if the generator got slower
+"""
+from notation import board_from_fen, square_name, START_FEN
+import argparse
+import game
+import importlib
+import json
+import os
+import sys
+import time
+
+REFERENCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perft.epd')
+
+
+def generate(board, backend):
+    if board.turn == game.WHITE:
+        return backend.all_available_white_moves(board)
+    return backend.all_available_black_moves(board)
+
+
+def perft(board, depth, backend=game):
+    """
+    Returns the number of leaf nodes depth plies below the board
+    """
+    if depth == 0:
+        return 1
+    if backend.terminal(board):
+        return 0
+    moves = generate(board, backend)
+    if depth == 1:
+        return sum(len(mvs) for _, mvs in moves)
+    nodes = 0
+    for piece, mvs in moves:
+        for mv in mvs:
+            undo = backend.make_move(board, piece, mv)
+            nodes += perft(board, depth - 1, backend)
+            backend.unmake_move(board, undo)
+    return nodes
+
+
+def divide(board, depth, backend=game):
+    """
+    Returns the list of (move, leaf nodes) for every root move, moves written as 'e2e4'
+    """
+    result = []
+    if backend.terminal(board):
+        return result
+    for piece, mvs in generate(board, backend):
+        for mv in mvs:
+            frm, to = divmod(backend.move_id(piece, mv), 64)
+            undo = backend.make_move(board, piece, mv)
+            result.append((square_name(*divmod(frm, 8)) + square_name(*divmod(to, 8)), perft(board, depth - 1, backend)))
+            backend.unmake_move(board, undo)
+    return result
+
+
+def load_references(path=REFERENCE_FILE):
+    """
+    Returns the list of (fen, {depth: nodes}) from an EPD file with lines like 'FEN ;D1 20 ;D2 400'
+    """
+    positions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fen, *counts = line.split(';')
+            depths = {}
+            for count in counts:
+                key, nodes = count.split()
+                depths[int(key[1:])] = int(nodes)
+            positions.append((fen.strip(), depths))
+    return positions
+
+
+def load_position(fen, backend):
+    board = board_from_fen(fen)
+    if backend is not game:
+        board = backend.BitBoard.from_board(board)
+    return board
+
+
+def check(backend, max_depth):
+    """
+    Runs perft on every reference position up to max_depth.
+    Returns (number of wrong counts, nodes, seconds).
+    """
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for fen, depths in load_references():
+        for depth, expected in sorted(depths.items()):
+            if depth > max_depth:
+                continue
+            board = load_position(fen, backend)
+            start = time.perf_counter()
+            nodes = perft(board, depth, backend)
+            seconds = time.perf_counter() - start
+            total_nodes += nodes
+            total_seconds += seconds
+            status = 'ok' if nodes == expected else f'FAILED, expected {expected}'
+            if nodes != expected:
+                failures += 1
+            print(f"{fen[:60]:<60} D{depth} {nodes:>10} {status}")
+    return failures, total_nodes, total_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and time the leaf nodes of the move generator")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--divide', action='store_true', help="print the leaf nodes below every root move")
+    parser.add_argument('--backend', default='game', choices=('game', 'bitboard'))
+    parser.add_argument('--check', action='store_true', help="compare with the reference counts in perft.epd")
+    parser.add_argument('--max-depth', type=int, default=4, help="deepest reference count checked")
+    parser.add_argument('--baseline', metavar='FILE', help="fail if slower than the speed saved in FILE")
+    parser.add_argument('--save-baseline', metavar='FILE', help="save the speed of this run to FILE")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline (default 0.25)")
+    args = parser.parse_args()
+    backend = importlib.import_module(args.backend)
+
+    if not args.check:
+        board = load_position(args.fen, backend)
+        start = time.perf_counter()
+        if args.divide:
+            result = divide(board, args.depth, backend)
+            for mv, nodes in result:
+                print(f"{mv}: {nodes}")
+            nodes = sum(nodes for _, nodes in result)
+            print(f"moves: {len(result)}")
+        else:
+            nodes = perft(board, args.depth, backend)
+        seconds = time.perf_counter() - start
+        print(f"nodes: {nodes}, {seconds:.3f}s, {nodes / max(seconds, 1e-9):.0f} nodes/s")
+        return
+
+    failures, nodes, seconds = check(backend, args.max_depth)
+    speed = nodes / max(seconds, 1e-9)
+    print(f"{nodes} nodes in {seconds:.3f}s, {speed:.0f} nodes/s, {failures} wrong counts")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'backend': args.backend, 'max_depth': args.max_depth, 'nodes_per_second': speed}, f)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['nodes_per_second']
+        if speed < baseline * (1 - args.tolerance):
+            print(f"Slower than the baseline: {speed:.0f} nodes/s against {baseline:.0f} nodes/s")
+            failures += 1
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 # ✅
 
 class Point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -0,0 +1,54 @@
+"""
+Pondering
+
+While the human thinks about a move, a background thread searches the position from the human's side.
+The search writes its results into the transposition table the computer's search uses, so after the human
+moves, the positions below every reply are already searched a few plies deep and the computer's own
+iterative deepening gets through its first depths almost for free. The thread searches a copy of the board,
+and is stopped through the stop event of its search context as soon as the human's move is entered.
+"""
+from copy import deepcopy
+from runner import SearchContext, iterative_deepening
+import threading
+import time
+
+
+class Ponderer:
+    def __init__(self, tt, **options):
+        """
+        tt: TranspositionTable shared with the computer's search
+        options: other SearchContext options of the pondering search
+        """
+        self.tt = tt
+        self.options = options
+        self.thread = None
+        self.ctx = None
+        self.result = None
+
+    def start(self, board, color):
+        """
+        Starts searching the board for color, the side the human plays, in the background
+        """
+        self.stop()
+        self.ctx = SearchContext(tt=self.tt, stop=threading.Event(), **self.options)
+        self.result = None
+        board = deepcopy(board)
+        self.start_time = time.monotonic()
+        self.thread = threading.Thread(target=self._search, args=(board, color), daemon=True)
+        self.thread.start()
+
+    def _search(self, board, color):
+        self.result = iterative_deepening(board, color, ctx=self.ctx)
+
+    def stop(self):
+        """
+        Stops the background search and waits for it.
+        Returns (depth completed, nodes searched, seconds), None if nothing was pondering.
+        """
+        if self.thread is None:
+            return None
+        self.ctx.stop.set()
+        self.thread.join()
+        self.thread = None
+        depth = self.result[3] if self.result is not None else 0
+        return depth, self.ctx.nodes, time.monotonic() - self.start_time
@@ -1,48 +1,551 @@
 from game import *
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, bound
+from ordering import MoveOrdering
+from book import OpeningBook
+from tablebase import Tablebases, TABLE_DIR
+from analysis import AnalysisCache
+from stats import SearchStats, TimedBackend, profiled
+import frontier
+import argparse
+import game
 import math
+import time
+
+
+# Half width of the aspiration window around the score of the previous depth
+ASPIRATION_WINDOW = Points['Pawn'] // 2
+# Scores beyond MATE_BOUND are mates or tablebase wins; inside the search they count the plies from the root
+MATE_BOUND = MATE - 256
+# Null move pruning: plies taken off the search after passing, the depth it needs and the strength points of
+# the pieces (besides pawns and king) the side to move must have left, as a guard against zugzwang
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MATERIAL = Points['Rook']
+# Late move reductions: quiet moves searched after the first LMR_MOVES of a node at least LMR_MIN_DEPTH deep
+# are searched LMR_REDUCTION plies shallower first
+LMR_MOVES = 3
+LMR_MIN_DEPTH = 3
+LMR_REDUCTION = 1
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time or node budget is used up, or the search is stopped
+    """
+
+
+class SearchContext:
+    def __init__(self, backend=game, tt=None, deadline=None, max_nodes=None, ordering=True, stats=None, tablebases=None,
+                 pvs=True, aspiration=True, null_move=True, lmr=True, stop=None, batch_eval=False):
+        """
+        State shared by all the nodes of a search
+        backend: module with the board functions the search uses (game or bitboard)
+        tt: TranspositionTable or None
+        deadline: time.monotonic() value at which the search is aborted, None for no limit
+        max_nodes: number of nodes after which the search is aborted, None for no limit
+        ordering: order moves by MVV-LVA, killer moves and history, instead of generation order
+        stats: SearchStats collecting counts and timings, None to collect nothing
+        tablebases: Tablebases probed for the exact score of the endgames they hold, None to search them
+        pvs: principal variation search, every move after the first is searched with a null window first
+        aspiration: iterative deepening searches each depth with a window around the score of the previous one
+        null_move: null move pruning, cut a node off when passing the move still fails high
+        lmr: late move reductions, search quiet moves ordered late shallower first
+        stop: threading.Event which aborts the search from another thread when set, None if it can not be stopped
+        batch_eval: score the children of depth 1 nodes together with NumPy (see frontier.py) instead of one by one
+        """
+        self.backend = TimedBackend(backend, stats) if stats is not None else backend
+        self.stats = stats
+        self.tt = tt
+        self.tablebases = tablebases
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.stop = stop
+        self.ordering = MoveOrdering() if ordering else None
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.null_move = null_move
+        self.lmr = lmr
+        if batch_eval:
+            frontier.require()
+        self.batch_eval = batch_eval
+        # Set while making the null move, so the node after it does not pass again
+        self.after_null = False
+        self.nodes = 0
+        # Distance from the root of the node being searched
+        self.ply = 0
+
+    def count_node(self):
+        """
+        Counts a node, raising SearchTimeout once the budget is used up or the search is stopped.
+        The clock and the stop event are only read every 256 nodes.
+        """
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout
+        if self.nodes & 255 == 0:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise SearchTimeout
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout
+
+
+def ordered_moves(board, moves, color, hint, ctx):
+    """
+    Flattens the moves grouped by piece into (piece, move) pairs in the order they should be searched
+    """
+    backend = ctx.backend
+    if ctx.ordering is not None:
+        return ctx.ordering.order(board, moves, color, ctx.ply, hint, backend)
+    flat = [(piece, mv) for piece, mvs in moves for mv in mvs]
+    if hint is not None:
+        for i, (piece, mv) in enumerate(flat):
+            if backend.move_id(piece, mv) == hint:
+                flat.insert(0, flat.pop(i))
+                break
+    return flat
+
+
+def staged_moves(board, color, hint, ctx):
+    """
+    Yields the (piece, move) pairs of color in the order they should be searched, generating them in stages:
+    the hash move, then the captures by MVV-LVA, then the quiet moves by killers and history. A stage is only
+    generated once the moves before it are searched, so a node cut off by the hash move or a capture never
+    generates the quiet moves. Without move ordering the moves are generated at once, in generation order.
+    """
+    backend = ctx.backend
+    if ctx.ordering is None:
+        moves = backend.all_available_white_moves(board) if color == WHITE else backend.all_available_black_moves(board)
+        yield from ordered_moves(board, moves, color, hint, ctx)
+        return
+    if hint is not None:
+        hash_move = backend.legal_move(board, color, hint)
+        if hash_move is not None:
+            yield hash_move
+        else:
+            hint = None
+    stages = backend.staged_moves(board, color)
+    pairs = [(piece, mv) for piece, mvs in next(stages) for mv in mvs]
+    if hint is not None:
+        pairs = [(piece, mv) for piece, mv in pairs if backend.move_id(piece, mv) != hint]
+    yield from ctx.ordering.order_captures(board, pairs, backend)
+    pairs = [(piece, mv) for piece, mvs in next(stages) for mv in mvs]
+    if hint is not None:
+        pairs = [(piece, mv) for piece, mv in pairs if backend.move_id(piece, mv) != hint]
+    yield from ctx.ordering.order_quiets(pairs, color, ctx.ply, backend)
+
+
+def score_to_node(score, ply):
+    """
+    Returns a score counted from the root as counted from a node ply plies deep: mates are
+    stored in the transposition table that way, so they are right wherever the position is reached again
+    """
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_node(score, ply):
+    """
+    Returns a score counted from a node ply plies deep, like a stored or tablebase score, as counted from the root
+    """
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def no_moves_score(board, color, ctx):
+    """
+    Returns the score of a node where color has no legal move: checkmate if its king is attacked,
+    which loses the king on the next ply, stalemate (a draw) otherwise
+    """
+    if not ctx.backend.in_check(board, color):
+        return 0
+    score = MATE - ctx.ply - 1
+    return -score if color == WHITE else score
+
+
+def frontier_scores(board, moves, depth, ctx):
+    """
+    Returns the scores of the children of a depth 1 node scored as one batch, None if they are searched one by one.
+    The children are plain leaves only without tablebases, which would be probed at every child.
+    """
+    if depth != 1 or not ctx.batch_eval or ctx.tablebases is not None:
+        return None
+    if ctx.stats is not None:
+        ctx.stats.evaluations += len(moves)
+    return frontier.evaluate_children(board, moves, ctx.backend)
+
+
+def probe(tt, board, depth, alpha, beta, backend, ply=0):
+    """
+    Looks the position up in the transposition table.
+    Returns (cutoff, hint) where cutoff is (piece, move, score) if the stored result
+    is deep enough to end the search of this node and hint is the stored best move id.
+    ply: distance of the node from the root, which mate scores are counted from
+    """
+    entry = tt.probe(board.key)
+    if entry is None:
+        return None, None
+    _, stored_depth, score, flag, hint, _ = entry
+    score = score_from_node(score, ply)
+    if stored_depth >= depth and (flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha)):
+        if hint is None:
+            return (None, None, score), None
+        return (*backend.move_from_id(board, hint), score), hint
+    return None, hint
+
+
+def search_move(board, piece, mv, depth, alpha, beta, color, scout, ctx, reduction=0):
+    """
+    Makes the move of color, searches the position after it to depth and takes the move back. Returns the score.
+    scout: search with a null window on alpha (beta for black) first, and with the full window only if the
+    move turns out better, as principal variation search does for every move after the first
+    reduction: plies taken off the null window search of a late quiet move; it is searched to the full depth
+    only if the reduced search finds it better
+    """
+    backend = ctx.backend
+    search = minimize if color == WHITE else maximize
+    undo = backend.make_move(board, piece, mv)
+    ctx.ply += 1
+    try:
+        if (not scout and not reduction) or (alpha if color == WHITE else beta) in (-math.inf, math.inf):
+            return search(board, depth, alpha, beta, ctx)[2]
+        if reduction:
+            if ctx.stats is not None:
+                ctx.stats.reductions += 1
+            if color == WHITE:
+                value = search(board, depth - reduction, alpha, alpha + 1, ctx)[2]
+            else:
+                value = search(board, depth - reduction, beta - 1, beta, ctx)[2]
+            # Only a fail low is trusted, a reduced fail high is searched again to the full depth
+            if (value <= alpha) if color == WHITE else (value >= beta):
+                return value
+            if ctx.stats is not None:
+                ctx.stats.reduction_researches += 1
+        if color == WHITE:
+            value = search(board, depth, alpha, alpha + 1, ctx)[2]
+        else:
+            value = search(board, depth, beta - 1, beta, ctx)[2]
+        if alpha < value < beta:
+            if ctx.stats is not None:
+                ctx.stats.researches += 1
+            value = search(board, depth, alpha, beta, ctx)[2]
+        return value
+    finally:
+        ctx.ply -= 1
+        backend.unmake_move(board, undo)
+
+
+def null_move_search(board, depth, alpha, beta, color, ctx):
+    """
+    Passes the move of color and searches the position with a null window on beta (alpha for black),
+    NULL_MOVE_REDUCTION plies shallower. Returns the score: if even passing does not let the other side
+    get below beta (above alpha), a real move would not either, and the node can be cut off.
+    """
+    backend = ctx.backend
+    backend.make_null_move(board)
+    ctx.ply += 1
+    ctx.after_null = True
+    try:
+        if color == WHITE:
+            return minimize(board, depth - 1 - NULL_MOVE_REDUCTION, beta - 1, beta, ctx)[2]
+        return maximize(board, depth - 1 - NULL_MOVE_REDUCTION, alpha, alpha + 1, ctx)[2]
+    finally:
+        ctx.ply -= 1
+        backend.unmake_null_move(board)
+
+
+def null_move_allowed(board, depth, alpha, beta, color, after_null, ctx):
+    """
+    Returns true if the node may try null move pruning: not right after another null move, deep enough,
+    with a bound to prove, with enough pieces left that passing is unlikely to be the best move (zugzwang),
+    and not in check, where passing would leave the king to be taken
+    """
+    return (ctx.null_move and not after_null and depth >= NULL_MOVE_MIN_DEPTH and ctx.ply > 0
+            and (beta if color == WHITE else alpha) not in (-math.inf, math.inf)
+            and ctx.backend.material(board, color) >= NULL_MOVE_MATERIAL
+            and not ctx.backend.in_check(board, color))
+
+
+def reduction(board, piece, mv, depth, index, ctx):
+    """
+    Returns the plies by which late move reductions shorten the search of the index-th move
+    """
+    if not ctx.lmr or depth < LMR_MIN_DEPTH or index < LMR_MOVES:
+        return 0
+    if ctx.backend.capture(board, piece, mv)[0] is not None:
+        return 0
+    return LMR_REDUCTION
+
 
 # Black always tries to minimize the score
-def minimize(board, depth, alpha, beta):
-    if terminal(board) or depth == 0:
-        return None, None, evaluation(board)
+def minimize(board, depth, alpha, beta, ctx=None):
+    if ctx is None:
+        ctx = SearchContext()
+    after_null, ctx.after_null = ctx.after_null, False
+    ctx.count_node()
+    backend, tt = ctx.backend, ctx.tt
+    if backend.terminal(board):
+        return None, None, backend.evaluation(board)
+    if ctx.tablebases is not None:
+        score = ctx.tablebases.score(board)
+        if score is not None:
+            return None, None, score_from_node(score, ctx.ply)
+    if depth == 0:
+        return None, None, backend.evaluation(board)
+    hint = None
+    if tt is not None:
+        cutoff, hint = probe(tt, board, depth, alpha, beta, backend, ctx.ply)
+        if cutoff is not None:
+            return cutoff
+        alpha_orig, beta_orig = alpha, beta
+    if null_move_allowed(board, depth, alpha, beta, BLACK, after_null, ctx):
+        value = null_move_search(board, depth, alpha, beta, BLACK, ctx)
+        if value <= alpha:
+            if ctx.stats is not None:
+                ctx.stats.null_move_cutoffs += 1
+            return None, None, value
+    moves = staged_moves(board, BLACK, hint, ctx)
     minim = math.inf
     best_move = None
     best_choice =  None
-    for actions in all_available_black_moves(board):
-        piece = actions[0]
-        for mv in actions[1]:
-            (_, _, value) = maximize(piece.result(board, mv), depth - 1, alpha, beta)
-            beta = min(beta, value)
-            if value < minim:
-                best_move = mv
-                best_choice = piece
-                minim = value
-            if alpha >= beta:
-                break
+    scores = None
+    if depth == 1 and ctx.batch_eval:
+        moves = list(moves)
+        scores = frontier_scores(board, moves, depth, ctx)
+    index = -1
+    for index, (piece, mv) in enumerate(moves):
+        if scores is not None:
+            # The child is a leaf: count it as its search would, and take its score from the batch
+            ctx.count_node()
+            value = scores[index]
+        else:
+            value = search_move(board, piece, mv, depth - 1, alpha, beta, BLACK, ctx.pvs and index > 0, ctx,
+                                reduction(board, piece, mv, depth, index, ctx))
+        beta = min(beta, value)
+        if value < minim:
+            best_move = mv
+            best_choice = piece
+            minim = value
+        if alpha >= beta:
+            if ctx.ordering is not None:
+                ctx.ordering.cutoff(board, piece, mv, BLACK, ctx.ply, depth, backend)
+            if ctx.stats is not None:
+                ctx.stats.cutoff(index)
+            break
+    if index < 0:
+        return None, None, no_moves_score(board, BLACK, ctx)
+    if tt is not None:
+        tt.store(board.key, depth, score_to_node(minim, ctx.ply), bound(minim, alpha_orig, beta_orig),
+                 backend.move_id(best_choice, best_move) if best_choice is not None else None)
     return best_choice, best_move, minim
 
 # White always tries to maximize the score
-def maximize(board, depth, alpha, beta):
-    if terminal(board) or depth == 0:
-        return None, None, evaluation(board)
+def maximize(board, depth, alpha, beta, ctx=None):
+    if ctx is None:
+        ctx = SearchContext()
+    after_null, ctx.after_null = ctx.after_null, False
+    ctx.count_node()
+    backend, tt = ctx.backend, ctx.tt
+    if backend.terminal(board):
+        return None, None, backend.evaluation(board)
+    if ctx.tablebases is not None:
+        score = ctx.tablebases.score(board)
+        if score is not None:
+            return None, None, score_from_node(score, ctx.ply)
+    if depth == 0:
+        return None, None, backend.evaluation(board)
+    hint = None
+    if tt is not None:
+        cutoff, hint = probe(tt, board, depth, alpha, beta, backend, ctx.ply)
+        if cutoff is not None:
+            return cutoff
+        alpha_orig, beta_orig = alpha, beta
+    if null_move_allowed(board, depth, alpha, beta, WHITE, after_null, ctx):
+        value = null_move_search(board, depth, alpha, beta, WHITE, ctx)
+        if value >= beta:
+            if ctx.stats is not None:
+                ctx.stats.null_move_cutoffs += 1
+            return None, None, value
+    moves = staged_moves(board, WHITE, hint, ctx)
     maxim = -math.inf
     best_move = None
     best_choice =  None
-    for actions in all_available_white_moves(board):
-        piece = actions[0]
-        for mv in actions[1]:
-            (_, _, value) = minimize(piece.result(board, mv), depth - 1, alpha, beta)
-            alpha = max(alpha, value)
-            if value > maxim:
-                best_move = mv
-                best_choice = piece
-                maxim = value
-            if alpha >= beta:
-                break
+    scores = None
+    if depth == 1 and ctx.batch_eval:
+        moves = list(moves)
+        scores = frontier_scores(board, moves, depth, ctx)
+    index = -1
+    for index, (piece, mv) in enumerate(moves):
+        if scores is not None:
+            # The child is a leaf: count it as its search would, and take its score from the batch
+            ctx.count_node()
+            value = scores[index]
+        else:
+            value = search_move(board, piece, mv, depth - 1, alpha, beta, WHITE, ctx.pvs and index > 0, ctx,
+                                reduction(board, piece, mv, depth, index, ctx))
+        alpha = max(alpha, value)
+        if value > maxim:
+            best_move = mv
+            best_choice = piece
+            maxim = value
+        if alpha >= beta:
+            if ctx.ordering is not None:
+                ctx.ordering.cutoff(board, piece, mv, WHITE, ctx.ply, depth, backend)
+            if ctx.stats is not None:
+                ctx.stats.cutoff(index)
+            break
+    if index < 0:
+        return None, None, no_moves_score(board, WHITE, ctx)
+    if tt is not None:
+        tt.store(board.key, depth, score_to_node(maxim, ctx.ply), bound(maxim, alpha_orig, beta_orig),
+                 backend.move_id(best_choice, best_move) if best_choice is not None else None)
     return best_choice, best_move, maxim
 
 
+def search_root(board, color, depth, root_moves, ctx, alpha=-math.inf, beta=math.inf):
+    """
+    Searches every root move to depth with alpha-beta inside the (alpha, beta) window.
+    Returns the list of (score, piece, move) in the order the moves were searched.
+    Only the score of the best move is exact, the others may be bounds, and the best score
+    is a bound too if it falls outside the window.
+    """
+    scored = []
+    for index, (piece, mv) in enumerate(root_moves):
+        value = search_move(board, piece, mv, depth - 1, alpha, beta, color, ctx.pvs and index > 0, ctx)
+        scored.append((value, piece, mv))
+        if color == WHITE:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            # Outside an aspiration window: the depth is searched again with a wider one
+            break
+    return scored
+
+
+def iterative_deepening(board, color, movetime=None, max_nodes=None, max_depth=64, ctx=None, on_iteration=None):
+    """
+    Searches the board for color to depth 1, 2, 3, ... until max_depth is reached or the
+    budget (movetime in seconds, max_nodes nodes) is used up.
+    Each iteration searches the root moves in the order of the scores of the previous one.
+    Returns (piece, move, score, depth) of the last completed depth, (None, None, None, 0) if there are no moves.
+    on_iteration: optional function called with (depth, piece, move, score, nodes, seconds) after each completed depth
+    """
+    if ctx is None:
+        ctx = SearchContext()
+    backend = ctx.backend
+    start = time.monotonic()
+    ctx.deadline = start + movetime if movetime is not None else None
+    ctx.max_nodes = ctx.nodes + max_nodes if max_nodes is not None else None
+    if backend.terminal(board):
+        return None, None, None, 0
+    moves = backend.all_available_white_moves(board) if color == WHITE else backend.all_available_black_moves(board)
+    root_moves = ordered_moves(board, moves, color, None, ctx)
+    if not root_moves:
+        return None, None, None, 0
+
+    best = (root_moves[0][0], root_moves[0][1], None, 0)
+    for depth in range(1, max_depth + 1):
+        alpha, beta = -math.inf, math.inf
+        delta = ASPIRATION_WINDOW
+        if ctx.aspiration and best[2] is not None and abs(best[2]) < MATE_BOUND:
+            alpha, beta = best[2] - delta, best[2] + delta
+        try:
+            while True:
+                scored = search_root(board, color, depth, root_moves, ctx, alpha, beta)
+                values = [value for value, _, _ in scored]
+                value = max(values) if color == WHITE else min(values)
+                if (value > alpha or alpha == -math.inf) and (value < beta or beta == math.inf):
+                    break
+                # The score fell outside the window: widen it on that side, up to the full window
+                if ctx.stats is not None:
+                    ctx.stats.aspiration_researches += 1
+                delta *= 4
+                if value <= alpha:
+                    alpha = value - delta if delta < Points['Queen'] else -math.inf
+                else:
+                    beta = value + delta if delta < Points['Queen'] else math.inf
+        except SearchTimeout:
+            break
+        # Best first; the sort is stable, so equal scores keep their order
+        scored.sort(key=lambda item: -item[0] if color == WHITE else item[0])
+        value, piece, mv = scored[0]
+        best = (piece, mv, value, depth)
+        root_moves = [(piece, mv) for _, piece, mv in scored]
+        if ctx.stats is not None:
+            ctx.stats.iteration(depth, ctx.nodes, time.monotonic() - start, value)
+        if on_iteration is not None:
+            on_iteration(depth, piece, mv, value, ctx.nodes, time.monotonic() - start)
+        if abs(value) >= MATE_BOUND:
+            # A mate is already in sight, searching deeper will not change the move
+            break
+    ctx.deadline = ctx.max_nodes = None
+    if ctx.stats is not None:
+        ctx.stats.nodes = ctx.nodes
+        ctx.stats.seconds = time.monotonic() - start
+    return best
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Play chess against the computer")
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table size in megabytes (0 disables it)")
+    parser.add_argument('--movetime', type=float, default=3.0, metavar='SECONDS', help="time budget for each computer move")
+    parser.add_argument('--nodes', type=int, default=None, help="node budget for each computer move")
+    parser.add_argument('--depth', type=int, default=64, help="maximum search depth")
+    parser.add_argument('--backend', choices=('game', 'bitboard'), default='game',
+                        help="move generator the computer searches with (see bitboard.py)")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes for a parallel root search (1 searches serially)")
+    parser.add_argument('--stats', action='store_true', help="print search statistics after each computer move")
+    parser.add_argument('--stats-json', metavar='FILE', help="append the search statistics of each computer move to FILE as JSON lines")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'), help="run each computer search under a profiler")
+    parser.add_argument('--no-pvs', dest='pvs', action='store_false', help="search every move with the full window")
+    parser.add_argument('--no-aspiration', dest='aspiration', action='store_false', help="search every depth with the full window")
+    parser.add_argument('--no-null-move', dest='null_move', action='store_false', help="turn null move pruning off")
+    parser.add_argument('--no-lmr', dest='lmr', action='store_false', help="turn late move reductions off")
+    parser.add_argument('--ponder', action='store_true', help="search in the background while you think (needs the transposition table)")
+    parser.add_argument('--batch-eval', action='store_true', help="score the leaves of a node together with NumPy")
+    parser.add_argument('--debug-eval', action='store_true', help="check the incremental evaluation against a full recompute")
+    parser.add_argument('--book', metavar='FILE', help="play from this opening book while it has a move for the position")
+    parser.add_argument('--tablebases', metavar='DIR', nargs='?', const=TABLE_DIR,
+                        help="play the endgames held by the tablebases of DIR (default: tables) perfectly")
+    parser.add_argument('--cache', metavar='FILE', help="reuse the searches saved in this analysis cache and save new ones to it")
+    parser.add_argument('--cache-entries', type=int, default=100000, help="positions kept in the analysis cache")
+    parser.add_argument('--cache-depth', type=int, default=5,
+                        help="shallowest cached search played instead of searching (at most --depth)")
+    args = parser.parse_args()
+    if args.ponder and (args.workers > 1 or args.hash <= 0):
+        parser.error("--ponder needs the transposition table of a serial search (--workers 1 and --hash above 0)")
+    game.DEBUG_EVAL = game.DEBUG_EVAL or args.debug_eval
+    TT = TranspositionTable(args.hash) if args.hash > 0 and args.workers == 1 else None
+    BOOK = OpeningBook(args.book) if args.book else None
+    TABLEBASES = Tablebases(args.tablebases) if args.tablebases else None
+    CACHE = AnalysisCache(args.cache, args.cache_entries) if args.cache else None
+    SEARCH_OPTIONS = {'tablebases': TABLEBASES, 'pvs': args.pvs, 'aspiration': args.aspiration,
+                      'null_move': args.null_move, 'lmr': args.lmr, 'batch_eval': args.batch_eval}
+    if args.batch_eval:
+        try:
+            frontier.require()
+        except ImportError as e:
+            parser.error(str(e))
+    BACKEND = game
+    if args.backend == 'bitboard':
+        import bitboard
+        BACKEND = bitboard
+    PARALLEL = None
+    if args.workers > 1:
+        from parallel import ParallelSearch
+        PARALLEL = ParallelSearch(args.workers, args.hash, args.backend, tablebases=args.tablebases, pvs=args.pvs,
+                                  null_move=args.null_move, lmr=args.lmr, batch_eval=args.batch_eval)
+    PONDER = None
+    if args.ponder:
+        from ponder import Ponderer
+        PONDER = Ponderer(TT, **SEARCH_OPTIONS)
+
     while True:
         print("Enter your choice:\n 'B' for Black \n 'W' for White")
         player = input("> ")
@@ -57,10 +560,12 @@ def main():
     while n < 100:
         if n % 2 == 0:
             print(f"Your Turn! ({PLAYER})")
+            if PONDER:
+                PONDER.start(BOARD, PLAYER)
             while True:
                 piece = input("Enter the piece name you wanna move:")
                 if piece in PLAYER_PIECES:
-                    if not PLAYER_PIECES[piece].actions(BOARD):
+                    if not legal_actions(BOARD, PLAYER_PIECES[piece]):
                         print("Moves are not available for this piece")
                     else:
                         break
@@ -72,7 +577,7 @@ def main():
                             print(f"{key} at {obj.pos}")
             choice = PLAYER_PIECES[piece] 
             while True:
-                print(f"Available moves for {choice.name}: {choice.actions(BOARD)}")
+                print(f"Available moves for {choice.name}: {legal_actions(BOARD, choice)}")
                 x, y = map(int, input("Enter your move:").split())
                 mv = Point(x, y)
                 flag = move(BOARD, choice, mv)
@@ -83,33 +588,81 @@ def main():
                         print(f"{choice.name} has moved from {choice.pos} to {mv}")
                     break
                 print("Invalid move!")
+            if PONDER:
+                depth, nodes, seconds = PONDER.stop()
+                print(f"Pondered to depth {depth} ({nodes} nodes) in {seconds:.1f}s")
             display(BOARD)
             print(f"Evaluation:{evaluation(BOARD)}")
             win_check = winner(BOARD)
             if win_check:
-                print(f"{win_check} won!")
+                print(f"Checkmate, {win_check} won!")
+                break
+            if stalemate(BOARD):
+                print("Stalemate, the game is drawn!")
                 break
         else:
             print(f"Computer's Turn ! ({ENEMY})")
-            if ENEMY == BLACK:
-                pc, mv, _ = minimize(BOARD, 3, -math.inf, math.inf)
-                if pc.num:
-                    print(f"{pc.name + '-' + pc.num} has moved from {pc.pos} to {mv}")
+            if TT:
+                TT.new_search()
+            book_move = BOOK.choose(BOARD) if BOOK else None
+            tablebase_move = TABLEBASES.best_move(BOARD) if TABLEBASES and not book_move else None
+            cached = None
+            if CACHE and not book_move and not tablebase_move:
+                cached = CACHE.lookup(BOARD, min(args.depth, args.cache_depth))
+            search_start = time.monotonic()
+            if book_move:
+                pc, mv = book_move
+                print("Book move")
+            elif tablebase_move:
+                pc, mv, value = tablebase_move
+                print(f"Tablebase move, score {value}")
+            elif cached:
+                pc, mv, value, depth = cached
+                print(f"Cached search of depth {depth}, score {value}")
+            else:
+                STATS = SearchStats() if args.stats or args.stats_json else None
+                # The bitboard backend searches its own copy of the position and returns squares
+                position = BOARD if BACKEND is game else BACKEND.BitBoard.from_board(BOARD)
+                if PARALLEL:
+                    search, search_args = PARALLEL.iterative_deepening, (position, ENEMY, args.movetime, args.nodes, args.depth, STATS)
+                else:
+                    ctx = SearchContext(BACKEND, tt=TT, stats=STATS, **SEARCH_OPTIONS)
+                    search, search_args = iterative_deepening, (position, ENEMY, args.movetime, args.nodes, args.depth, ctx)
+                nodes = PARALLEL.nodes if PARALLEL else 0
+                if args.profile:
+                    pc, mv, value, depth = profiled(args.profile, search, *search_args)
                 else:
-                    print(f"{pc.name} has moved from {pc.pos} to {mv}")
-                move(BOARD, pc, mv)
-            elif ENEMY == WHITE:
-                pc, mv, _ = maximize(BOARD, 3, -math.inf, math.inf)
-                if pc.num:
-                    print(f"{pc.name + '-' + pc.num} has moved from {pc.pos} to {mv}")
+                    pc, mv, value, depth = search(*search_args)
+                if BACKEND is not game and pc is not None:
+                    pc, mv = BOARD[pc // 8][pc % 8], Point(mv // 8, mv % 8)
+                if PARALLEL:
+                    print(f"Searched to depth {depth} with {PARALLEL.workers} workers ({PARALLEL.nodes - nodes} nodes), score {value}")
                 else:
-                    print(f"{pc.name} has moved from {pc.pos} to {mv}")
-                move(BOARD, pc, mv)
+                    print(f"Searched to depth {depth} ({ctx.nodes} nodes), score {value}")
+                if args.stats:
+                    print(STATS.report())
+                if args.stats_json:
+                    with open(args.stats_json, 'a') as f:
+                        f.write(STATS.to_json() + '\n')
+            if CACHE and not book_move and not tablebase_move:
+                if not cached:
+                    CACHE.store(BOARD, pc, mv, value, depth, time.monotonic() - search_start)
+                print(CACHE.report())
+            if pc.num:
+                print(f"{pc.name + '-' + pc.num} has moved from {pc.pos} to {mv}")
+            else:
+                print(f"{pc.name} has moved from {pc.pos} to {mv}")
+            move(BOARD, pc, mv)
+            if TT:
+                print(TT.report())
             display(BOARD)
             print(f"Evaluation:{evaluation(BOARD)}")
             win_check = winner(BOARD)
             if win_check:
-                print(f"{win_check} won!")
+                print(f"Checkmate, {win_check} won!")
+                break
+            if stalemate(BOARD):
+                print("Stalemate, the game is drawn!")
                 break
         n += 1
 
@@ -0,0 +1,282 @@
+"""
+Self-play tournament
+
+Plays engine-vs-engine games between two engine configurations on a pool of worker processes and reports the
+result of the first engine with a 95% confidence interval, its Elo difference, and the speed of both engines.
+Every opening is played twice, with the colors swapped, so neither engine profits from a lucky opening.
+
+An engine is written as comma separated settings: the budget of every move (depth=N, movetime=SECONDS, nodes=N),
+the transposition table size (hash=MB) and the SearchContext options (pvs, aspiration, null_move, lmr, ordering),
+for example 'depth=4,lmr=off'. The games are saved as PGN.
+
+    python selfplay.py --engine1 movetime=0.2 --engine2 movetime=0.2,null_move=off,lmr=off --games 200 --pgn games.pgn
+    python selfplay.py --openings openings.epd --engine1 depth=4 --engine2 depth=3
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from batch import read_positions
+from game import WHITE, BLACK, EMPTY, game_init, make_move, game_over, winner, legal_moves
+from notation import board_from_fen, board_to_fen, move_to_san, START_FEN
+from runner import SearchContext, iterative_deepening
+from transposition import TranspositionTable
+import argparse
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+SWITCHES = ('pvs', 'aspiration', 'null_move', 'lmr', 'ordering')
+# Plies without a capture or a pawn move after which the game is drawn (the fifty move rule)
+FIFTY_MOVES = 100
+# Deepest search of an engine without a depth budget
+MAX_DEPTH = 64
+
+
+def parse_engine(text):
+    """
+    Returns the engine settings {'depth', 'movetime', 'nodes', 'hash', 'options'} of a text like 'depth=4,lmr=off',
+    None for a budget which is not set
+    """
+    engine = {'depth': None, 'movetime': None, 'nodes': None, 'hash': 16, 'options': {}}
+    for setting in filter(None, text.split(',')):
+        key, _, value = setting.partition('=')
+        key = key.strip()
+        value = value.strip()
+        if key in ('depth', 'nodes', 'hash'):
+            engine[key] = int(value)
+        elif key == 'movetime':
+            engine[key] = float(value)
+        elif key in SWITCHES:
+            if value not in ('on', 'off'):
+                raise ValueError(f"{key} must be on or off, not {value!r}")
+            engine['options'][key] = value == 'on'
+        else:
+            raise ValueError(f"unknown engine setting {key!r}")
+    if engine['depth'] is None and engine['movetime'] is None and engine['nodes'] is None:
+        raise ValueError(f"engine {text!r} needs a depth, movetime or nodes budget")
+    return engine
+
+
+def random_openings(count, plies=6, seed=1):
+    """
+    Returns count distinct FENs reached by plies random moves from the start position
+    """
+    rng = random.Random(seed)
+    fens = []
+    for _ in range(count * 20):
+        board = game_init(WHITE)[0]
+        for _ in range(plies):
+            choices = [(piece, mv) for piece, mvs in legal_moves(board, board.turn) for mv in mvs]
+            if not choices:
+                break
+            make_move(board, *rng.choice(choices))
+        fen = board_to_fen(board)
+        if not game_over(board) and fen not in fens:
+            fens.append(fen)
+            if len(fens) == count:
+                break
+    return fens
+
+
+def play(number, fen, white, black, max_plies):
+    """
+    Plays one game in a worker process. white and black are engine settings of parse_engine.
+    Returns the game record: number, fen, result ('1-0', '0-1' or '1/2-1/2'), the reason the game ended
+    (checkmate, stalemate, repetition, fifty moves or move limit), the SAN moves, and the nodes, seconds
+    and searches of each color.
+    """
+    board = board_from_fen(fen)
+    engines = {WHITE: white, BLACK: black}
+    tables = {color: TranspositionTable(engine['hash']) if engine['hash'] > 0 else None for color, engine in engines.items()}
+    record = {'number': number, 'fen': fen, 'moves': [],
+              'nodes': {WHITE: 0, BLACK: 0}, 'seconds': {WHITE: 0.0, BLACK: 0.0}, 'searches': {WHITE: 0, BLACK: 0}}
+    seen = {board.key: 1}
+    quiet = 0
+    result, reason = '1/2-1/2', 'move limit'
+    for _ in range(max_plies):
+        if game_over(board):
+            break
+        color = board.turn
+        engine, tt = engines[color], tables[color]
+        if tt is not None:
+            tt.new_search()
+        ctx = SearchContext(tt=tt, **engine['options'])
+        start = time.perf_counter()
+        depth = engine['depth'] if engine['depth'] is not None else MAX_DEPTH
+        piece, mv, _, _ = iterative_deepening(board, color, engine['movetime'], engine['nodes'], depth, ctx)
+        record['seconds'][color] += time.perf_counter() - start
+        record['nodes'][color] += ctx.nodes
+        record['searches'][color] += 1
+        record['moves'].append(move_to_san(board, piece, mv))
+        quiet = 0 if piece.name == 'Pawn' or board[mv.x][mv.y] != EMPTY else quiet + 1
+        make_move(board, piece, mv)
+        seen[board.key] = seen.get(board.key, 0) + 1
+        if seen[board.key] >= 3:
+            reason = 'repetition'
+            break
+        if quiet >= FIFTY_MOVES:
+            reason = 'fifty moves'
+            break
+    # Also after the loop, so a mate or stalemate on the last ply (or the one ending it) is scored as such
+    if game_over(board):
+        won = winner(board)
+        result = '1/2-1/2' if won is None else '1-0' if won == WHITE else '0-1'
+        reason = 'stalemate' if won is None else 'checkmate'
+    record['result'] = result
+    record['reason'] = reason
+    return record
+
+
+def score_interval(wins, draws, losses, z=1.96):
+    """
+    Returns (score, low, high): the mean score per game (1 for a win, 1/2 for a draw) and its confidence
+    interval from the normal approximation, 95% for z = 1.96
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.5, 0.0, 1.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = z * math.sqrt(variance / games)
+    return score, max(score - margin, 0.0), min(score + margin, 1.0)
+
+
+def elo(score):
+    """
+    Returns the Elo difference of a mean score, +-inf for a score of 1 or 0
+    """
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def write_pgn(f, record, names):
+    """
+    Writes one game record as PGN, names maps each color to the name of the engine playing it
+    """
+    tags = [('Event', 'Self-play'), ('Round', record['number']), ('White', names[WHITE]), ('Black', names[BLACK]),
+            ('Result', record['result']), ('Termination', record['reason'])]
+    if record['fen'] != START_FEN:
+        tags += [('SetUp', '1'), ('FEN', record['fen'])]
+    for key, value in tags:
+        f.write(f'[{key} "{value}"]\n')
+    black_first = record['fen'].split()[1] == 'b'
+    words = []
+    for i, san in enumerate(record['moves']):
+        ply = i + black_first
+        if ply % 2 == 0:
+            words.append(f"{ply // 2 + 1}.")
+        elif i == 0:
+            words.append(f"{ply // 2 + 1}...")
+        words.append(san)
+    words.append(record['result'])
+    line = ''
+    for word in words:
+        if len(line) + len(word) >= 80:
+            f.write(line.rstrip() + '\n')
+            line = ''
+        line += word + ' '
+    f.write(line.rstrip() + '\n\n')
+
+
+def run(engine1, engine2, openings, workers=None, max_plies=300, pgn=None, names=('engine1', 'engine2'), progress=None):
+    """
+    Plays every opening twice, engine1 as white then as black. Returns the summary: 'wins', 'draws' and 'losses'
+    of engine1, the number of games per way they ended in 'reasons', and {'nodes', 'seconds', 'moves'} of both
+    engines in 'engines'. names: names of the engines in the PGN
+    progress: optional function called with (games played, games in total, summary) after every game
+    """
+    workers = workers or multiprocessing.cpu_count()
+    summary = {'wins': 0, 'draws': 0, 'losses': 0, 'reasons': {},
+               'engines': [{'nodes': 0, 'seconds': 0.0, 'moves': 0} for _ in range(2)]}
+    games = [(number, fen, swapped) for number, (fen, swapped) in
+             enumerate(((fen, swapped) for fen in openings for swapped in (False, True)), 1)]
+    out = open(pgn, 'w') if pgn else None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {}
+            for number, fen, swapped in games:
+                white, black = (engine2, engine1) if swapped else (engine1, engine2)
+                futures[pool.submit(play, number, fen, white, black, max_plies)] = swapped
+            for done, future in enumerate(as_completed(futures), 1):
+                record, swapped = future.result(), futures[future]
+                # Index of the engine playing each color
+                colors = {WHITE: 1, BLACK: 0} if swapped else {WHITE: 0, BLACK: 1}
+                first = BLACK if swapped else WHITE
+                if record['result'] == '1/2-1/2':
+                    summary['draws'] += 1
+                elif (record['result'] == '1-0') == (first == WHITE):
+                    summary['wins'] += 1
+                else:
+                    summary['losses'] += 1
+                summary['reasons'][record['reason']] = summary['reasons'].get(record['reason'], 0) + 1
+                for color, engine in colors.items():
+                    stats = summary['engines'][engine]
+                    stats['nodes'] += record['nodes'][color]
+                    stats['seconds'] += record['seconds'][color]
+                    stats['moves'] += record['searches'][color]
+                if out:
+                    write_pgn(out, record, {color: names[engine] for color, engine in colors.items()})
+                    out.flush()
+                if progress is not None:
+                    progress(done, len(games), summary)
+    finally:
+        if out:
+            out.close()
+    return summary
+
+
+def report(summary, names=('engine1', 'engine2')):
+    """
+    Returns the summary of run as text
+    """
+    wins, draws, losses = summary['wins'], summary['draws'], summary['losses']
+    score, low, high = score_interval(wins, draws, losses)
+    lines = [f"{names[0]} vs {names[1]}: +{wins} ={draws} -{losses} in {wins + draws + losses} games",
+             f"score {100 * score:.1f}% (95% CI {100 * low:.1f}% - {100 * high:.1f}%), "
+             f"Elo {elo(score):+.0f} ({elo(low):+.0f} to {elo(high):+.0f})",
+             "endings: " + ', '.join(f"{reason} {count}" for reason, count in sorted(summary['reasons'].items()))]
+    for name, stats in zip(names, summary['engines']):
+        nps = stats['nodes'] / stats['seconds'] if stats['seconds'] else 0
+        per_move = stats['seconds'] / stats['moves'] if stats['moves'] else 0
+        lines.append(f"{name}: {nps:.0f} nodes/s, {per_move:.3f}s per move over {stats['moves']} moves")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine games and report the result of the first engine")
+    parser.add_argument('--engine1', required=True, help="settings of the engine under test, like 'depth=4,lmr=off'")
+    parser.add_argument('--engine2', required=True, help="settings of the reference engine")
+    parser.add_argument('--openings', help="FEN/EPD file of opening positions (default: random openings)")
+    parser.add_argument('--games', type=int, default=100, help="games played from random openings, two per opening")
+    parser.add_argument('--opening-plies', type=int, default=6, help="random plies of the random openings")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the random openings")
+    parser.add_argument('--max-plies', type=int, default=300, help="plies after which a game is drawn")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument('--pgn', help="save the games to this PGN file")
+    args = parser.parse_args()
+    try:
+        engine1, engine2 = parse_engine(args.engine1), parse_engine(args.engine2)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.openings:
+        openings = [fen for _, _, fen in read_positions(args.openings)]
+    else:
+        openings = random_openings(max(args.games // 2, 1), args.opening_plies, args.seed)
+    names = (args.engine1, args.engine2)
+
+    def progress(done, total, summary):
+        print(f"\r{done}/{total} games: +{summary['wins']} ={summary['draws']} -{summary['losses']}",
+              end='', file=sys.stderr, flush=True)
+
+    start = time.monotonic()
+    summary = run(engine1, engine2, openings, args.workers, args.max_plies, args.pgn, names, progress)
+    print(file=sys.stderr)
+    print(report(summary, names))
+    print(f"{time.monotonic() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Game server
+
+Hosts many human-vs-engine games at once over a local TCP or Unix socket. Every connection is a session with
+its own board. The event loop only parses and plays moves; the engine searches run on a bounded pool of worker
+processes, so a search never blocks the other sessions.
+
+At most one search per worker runs at a time, and at most --max-queue more wait for a worker. When the queue is
+full, a move is answered with 'busy' and not played, and the client should send it again later. A session waits
+for its engine move before its next command is read, so a fast client is also slowed down by the socket. The time
+an engine move waits in the queue counts against the move time of its session.
+
+The protocol is one line per command and exactly one line per reply, with moves written like 'e2e4':
+
+    new [white|black] [movetime SECONDS]   start a game as that color (default white), with that engine time per move
+        -> 'game FEN' when the client moves first, otherwise the engine's first move as below
+    move e2e4
+        -> 'engine e7e5 score S depth D seconds T', followed by ' result 1-0 checkmate' if the engine move ends the game
+        -> 'result 1-0 checkmate' or 'result 1/2-1/2 stalemate' if the client's move ends it
+        -> 'busy' if the engine queue is full; the move is not played
+    fen      -> 'fen FEN'
+    stats    -> 'stats {...}': sessions, queue depth, and latency percentiles in milliseconds as JSON
+    quit
+Any other command, or a move which is not legal, is answered with 'error ...'.
+
+    python server.py --port 8765 --workers 4 --movetime 1
+    python loadgen.py --port 8765 --clients 200
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from game import WHITE, BLACK, game_init, move, game_over, winner
+from notation import board_from_fen, board_to_fen
+from runner import SearchContext, iterative_deepening
+from transposition import TranspositionTable
+from uci import move_name, parse_move
+import argparse
+import asyncio
+import json
+import multiprocessing
+import signal
+import time
+
+# Shortest engine time per move left after waiting in the queue, so a move is always searched a little
+MIN_MOVETIME = 0.01
+# Latencies kept per metric for the percentiles
+LATENCY_WINDOW = 10000
+PERCENTILES = (50, 90, 99)
+
+# Transposition table of the worker process, set up by _init_worker
+_tt = None
+
+
+def _init_worker(hash_mb):
+    global _tt
+    _tt = TranspositionTable(hash_mb) if hash_mb > 0 else None
+
+
+def search(fen, movetime, max_depth):
+    """
+    Searches the position for the side to move in a worker process.
+    Returns (move like 'e2e4', score, depth, nodes, seconds), the move None if there is none.
+    """
+    board = board_from_fen(fen)
+    if _tt is not None:
+        _tt.new_search()
+    ctx = SearchContext(tt=_tt)
+    start = time.monotonic()
+    piece, mv, value, depth = iterative_deepening(board, board.turn, movetime, None, max_depth, ctx)
+    return move_name(piece, mv) if piece is not None else None, value, depth, ctx.nodes, time.monotonic() - start
+
+
+def percentiles(values, points=PERCENTILES):
+    """
+    Returns {'p50': ..., 'p90': ..., 'p99': ...} of the values by the nearest rank, empty if there are none
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    return {f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in points}
+
+
+class Busy(Exception):
+    """
+    Raised when the engine queue is full
+    """
+
+
+class Metrics:
+    def __init__(self):
+        self.sessions = 0
+        self.sessions_total = 0
+        self.searches = 0
+        self.rejected = 0
+        self.errors = 0
+        # Engine moves waiting for a worker, and the most that ever waited
+        self.queued = 0
+        self.queue_max = 0
+        self.running = 0
+        # Seconds from a command to its engine reply, waiting for a worker, and searching
+        self.latency = deque(maxlen=LATENCY_WINDOW)
+        self.queue_wait = deque(maxlen=LATENCY_WINDOW)
+        self.search_time = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self):
+        """
+        Returns the counters and the latency percentiles in milliseconds as a dict
+        """
+        def ms(values):
+            return {key: round(1000 * value, 1) for key, value in percentiles(values).items()}
+
+        return {'sessions': self.sessions, 'sessions_total': self.sessions_total, 'searches': self.searches,
+                'rejected': self.rejected, 'errors': self.errors, 'queued': self.queued, 'queue_max': self.queue_max,
+                'running': self.running, 'latency_ms': ms(self.latency), 'queue_wait_ms': ms(self.queue_wait),
+                'search_ms': ms(self.search_time)}
+
+    def report(self):
+        """
+        Returns the snapshot as a printable string
+        """
+        snapshot = self.snapshot()
+
+        def line(name):
+            return ', '.join(f"{key} {value}ms" for key, value in snapshot[name].items()) or 'none'
+
+        return (f"{snapshot['sessions']} sessions ({snapshot['sessions_total']} in total), {snapshot['searches']} searches, "
+                f"{snapshot['rejected']} rejected as busy, queue {snapshot['queued']} (max {snapshot['queue_max']})\n"
+                f"latency: {line('latency_ms')}\nqueue wait: {line('queue_wait_ms')}\nsearch: {line('search_ms')}")
+
+
+class Session:
+    def __init__(self, player=WHITE, movetime=1.0):
+        """
+        player: color of the client, the engine plays the other one
+        movetime: engine time per move in seconds
+        """
+        self.player = player
+        self.movetime = movetime
+        self.board = game_init(player)[0]
+        self.over = False
+
+
+class GameServer:
+    def __init__(self, workers=None, max_queue=64, movetime=1.0, max_movetime=10.0, max_depth=64, hash_mb=16):
+        """
+        workers: engine processes (default: number of CPUs)
+        max_queue: engine moves which may wait for a worker before moves are answered with 'busy'
+        movetime: default engine time per move, max_movetime: the most a session may ask for
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_queue = max_queue
+        self.movetime = movetime
+        self.max_movetime = max_movetime
+        self.max_depth = max_depth
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(hash_mb,))
+        self.slots = asyncio.Semaphore(self.workers)
+        self.metrics = Metrics()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def saturated(self):
+        """
+        Returns true if every worker is busy and the queue is full
+        """
+        return self.slots.locked() and self.metrics.queued >= self.max_queue
+
+    async def engine_move(self, session):
+        """
+        Searches the board of the session on the pool and plays the engine move.
+        Returns its reply line. Raises Busy without searching if the queue is full.
+        """
+        metrics = self.metrics
+        if self.saturated():
+            metrics.rejected += 1
+            raise Busy
+        queued = time.monotonic()
+        waiting = self.slots.locked()
+        if waiting:
+            metrics.queued += 1
+            metrics.queue_max = max(metrics.queue_max, metrics.queued)
+        try:
+            await self.slots.acquire()
+        finally:
+            if waiting:
+                metrics.queued -= 1
+        try:
+            waited = time.monotonic() - queued
+            metrics.queue_wait.append(waited)
+            metrics.running += 1
+            movetime = max(session.movetime - waited, MIN_MOVETIME)
+            loop = asyncio.get_running_loop()
+            name, value, depth, _, seconds = await loop.run_in_executor(
+                self.pool, search, board_to_fen(session.board), movetime, self.max_depth)
+        finally:
+            metrics.running -= 1
+            self.slots.release()
+        metrics.searches += 1
+        metrics.search_time.append(seconds)
+        piece, mv = parse_move(session.board, name)
+        move(session.board, piece, mv)
+        reply = f"engine {name} score {value} depth {depth} seconds {seconds:.3f}"
+        result = self.result(session)
+        return f"{reply} {result}" if result else reply
+
+    def result(self, session):
+        """
+        Returns 'result ...' if the game of the session is over, None while it goes on
+        """
+        board = session.board
+        if not game_over(board):
+            return None
+        session.over = True
+        won = winner(board)
+        if won is None:
+            return "result 1/2-1/2 stalemate"
+        return f"result {'1-0' if won == WHITE else '0-1'} checkmate"
+
+    async def command(self, session, words):
+        """
+        Executes one command of a session. Returns the reply line and the session (a new one after 'new').
+        """
+        command, args = words[0], words[1:]
+        if command == 'new':
+            player = BLACK if args[:1] == ['black'] else WHITE
+            movetime = self.movetime
+            if 'movetime' in args and args.index('movetime') + 1 < len(args):
+                movetime = min(float(args[args.index('movetime') + 1]), self.max_movetime)
+            session = Session(player, movetime)
+            if player == BLACK:
+                return await self.engine_move(session), session
+            return f"game {board_to_fen(session.board)}", session
+        if command == 'fen':
+            return f"fen {board_to_fen(session.board)}", session
+        if command == 'stats':
+            return f"stats {json.dumps(self.metrics.snapshot())}", session
+        if command == 'move' and len(args) == 1:
+            board = session.board
+            if session.over or board.turn != session.player:
+                return "error not your move", session
+            piece, mv = parse_move(board, args[0])
+            if self.saturated():
+                # Refuse before playing the move, so the client can send it again
+                self.metrics.rejected += 1
+                return "busy", session
+            move(board, piece, mv)
+            result = self.result(session)
+            if result:
+                return result, session
+            return await self.engine_move(session), session
+        raise ValueError(f"unknown command {' '.join(words)!r}")
+
+    async def handle(self, reader, writer):
+        """
+        Serves one connection until it sends quit or closes
+        """
+        metrics = self.metrics
+        metrics.sessions += 1
+        metrics.sessions_total += 1
+        session = Session(WHITE, self.movetime)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode(errors='replace').split()
+                if not words:
+                    continue
+                if words[0] == 'quit':
+                    break
+                start = time.monotonic()
+                try:
+                    reply, session = await self.command(session, words)
+                except Busy:
+                    reply = "busy"
+                except ValueError as e:
+                    metrics.errors += 1
+                    reply = f"error {e}"
+                else:
+                    if reply.startswith('engine'):
+                        metrics.latency.append(time.monotonic() - start)
+                writer.write((reply + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            metrics.sessions -= 1
+            writer.close()
+
+
+async def serve(args):
+    server = GameServer(args.workers, args.max_queue, args.movetime, args.max_movetime, args.depth, args.hash)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, args.unix, backlog=1024)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port, backlog=1024)
+        where = f"{args.host}:{args.port}"
+    print(f"Serving on {where} with {server.workers} engine workers")
+
+    async def report():
+        while True:
+            await asyncio.sleep(args.report)
+            print(server.metrics.report(), flush=True)
+
+    reporter = asyncio.create_task(report()) if args.report else None
+    # Stop serving on Ctrl-C or a termination request, then print the metrics
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        server.close()
+        print(server.metrics.report())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host human-vs-engine games over a socket")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None, help="engine processes (default: number of CPUs)")
+    parser.add_argument('--max-queue', type=int, default=64, help="engine moves waiting for a worker before answering busy")
+    parser.add_argument('--movetime', type=float, default=1.0, metavar='SECONDS', help="default engine time per move")
+    parser.add_argument('--max-movetime', type=float, default=10.0, metavar='SECONDS', help="most time per move a session may ask for")
+    parser.add_argument('--depth', type=int, default=64, help="maximum search depth")
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table size per worker")
+    parser.add_argument('--report', type=float, default=0, metavar='SECONDS', help="print the metrics every SECONDS")
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
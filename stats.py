@@ -0,0 +1,241 @@
+"""
+Search instrumentation
+
+A SearchStats object passed to SearchContext(stats=...) counts what the search does and where its time goes.
+The backend functions are wrapped by TimedBackend only while stats are collected, so a search without
+stats runs the plain backend functions.
+
+    python stats.py --fen FEN --movetime 5 --profile cprofile
+"""
+from time import perf_counter
+import cProfile
+import io
+import json
+import pstats
+import tracemalloc
+
+
+class SearchStats:
+    def __init__(self):
+        self.nodes = 0
+        self.seconds = 0.0
+        self.evaluations = 0
+        self.move_generations = 0
+        self.moves_made = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # Full window searches after a null window search failed high (PVS)
+        self.researches = 0
+        # Root searches repeated because the score fell outside the aspiration window
+        self.aspiration_researches = 0
+        # Nodes cut off by null move pruning
+        self.null_move_cutoffs = 0
+        # Moves searched with a late move reduction, and those searched again to the full depth
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+        # Time spent in make_move/unmake_move, which replaced copying the board
+        self.make_time = 0.0
+        # (depth, nodes, seconds, score) of every completed iteration
+        self.iterations = []
+
+    def cutoff(self, index):
+        """
+        Counts a beta cutoff caused by the move searched index-th in its node
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+    def add(self, other):
+        """
+        Adds the counts and times of the SearchStats of another search, e.g. of a worker process
+        """
+        for name in ('nodes', 'seconds', 'evaluations', 'move_generations', 'moves_made', 'cutoffs', 'first_move_cutoffs',
+                     'researches', 'aspiration_researches', 'null_move_cutoffs', 'reductions', 'reduction_researches',
+                     'eval_time', 'movegen_time', 'make_time'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def iteration(self, depth, nodes, seconds, score):
+        self.iterations.append((depth, nodes, seconds, score))
+
+    def branching_factors(self):
+        """
+        Returns the nodes of every iteration after the first divided by the nodes of the iteration before
+        """
+        counts = [nodes - previous for (_, nodes, _, _), (_, previous, _, _) in zip(self.iterations, [(0, 0, 0, 0)] + self.iterations)]
+        return [count / before for before, count in zip(counts, counts[1:]) if before]
+
+    def effective_branching_factor(self):
+        """
+        Returns the geometric mean of the branching factors: how many times more nodes each extra ply costs
+        """
+        factors = self.branching_factors()
+        if not factors:
+            return None
+        product = 1.0
+        for factor in factors:
+            product *= factor
+        return product ** (1 / len(factors))
+
+    def as_dict(self):
+        return {
+            'nodes': self.nodes,
+            'seconds': self.seconds,
+            'nodes_per_second': self.nodes / self.seconds if self.seconds else None,
+            'evaluations': self.evaluations,
+            'move_generations': self.move_generations,
+            'moves_made': self.moves_made,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else None,
+            'researches': self.researches,
+            'aspiration_researches': self.aspiration_researches,
+            'null_move_cutoffs': self.null_move_cutoffs,
+            'reductions': self.reductions,
+            'reduction_researches': self.reduction_researches,
+            'branching_factors': self.branching_factors(),
+            'effective_branching_factor': self.effective_branching_factor(),
+            'time': {'move_generation': self.movegen_time, 'evaluation': self.eval_time, 'make_unmake': self.make_time},
+            'iterations': [{'depth': depth, 'nodes': nodes, 'seconds': seconds, 'score': score}
+                           for depth, nodes, seconds, score in self.iterations],
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict())
+
+    def report(self):
+        """
+        Returns the statistics as printable text
+        """
+        seconds = self.seconds or 1e-9
+        first = 100 * self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
+        lines = [
+            f"nodes {self.nodes} ({self.nodes / seconds:.0f} nodes/s), {self.evaluations} leaf evaluations, "
+            f"{self.cutoffs} beta cutoffs ({first:.1f}% on the first move), {self.researches} PVS re-searches, "
+            f"{self.aspiration_researches} aspiration re-searches",
+            f"{self.null_move_cutoffs} null move cutoffs, {self.reductions} reduced moves "
+            f"({self.reduction_researches} searched again to the full depth)",
+            f"time {self.seconds:.3f}s: move generation {self.movegen_time:.3f}s ({100 * self.movegen_time / seconds:.0f}%), "
+            f"evaluation {self.eval_time:.3f}s ({100 * self.eval_time / seconds:.0f}%), "
+            f"make/unmake {self.make_time:.3f}s ({100 * self.make_time / seconds:.0f}%)",
+        ]
+        factors = [None] + self.branching_factors()
+        for (depth, nodes, elapsed, score), factor in zip(self.iterations, factors):
+            branching = f", branching factor {factor:.2f}" if factor is not None else ''
+            lines.append(f"  depth {depth}: {nodes} nodes, {elapsed:.3f}s, score {score}{branching}")
+        if self.effective_branching_factor() is not None:
+            lines.append(f"effective branching factor {self.effective_branching_factor():.2f}")
+        return '\n'.join(lines)
+
+
+class TimedBackend:
+    """
+    Backend which times and counts the calls to the functions of the wrapped backend module into stats
+    """
+    def __init__(self, backend, stats):
+        self.backend = backend
+        self.stats = stats
+        self.__name__ = backend.__name__
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def evaluation(self, board):
+        start = perf_counter()
+        value = self.backend.evaluation(board)
+        self.stats.eval_time += perf_counter() - start
+        self.stats.evaluations += 1
+        return value
+
+    def all_available_black_moves(self, board):
+        start = perf_counter()
+        moves = self.backend.all_available_black_moves(board)
+        self.stats.movegen_time += perf_counter() - start
+        self.stats.move_generations += 1
+        return moves
+
+    def all_available_white_moves(self, board):
+        start = perf_counter()
+        moves = self.backend.all_available_white_moves(board)
+        self.stats.movegen_time += perf_counter() - start
+        self.stats.move_generations += 1
+        return moves
+
+    def staged_moves(self, board, color):
+        # Each stage counts as a move generation, timed when it is asked for
+        stages = self.backend.staged_moves(board, color)
+        while True:
+            start = perf_counter()
+            moves = next(stages, None)
+            self.stats.movegen_time += perf_counter() - start
+            if moves is None:
+                return
+            self.stats.move_generations += 1
+            yield moves
+
+    def make_move(self, board, piece, mv):
+        start = perf_counter()
+        undo = self.backend.make_move(board, piece, mv)
+        self.stats.make_time += perf_counter() - start
+        self.stats.moves_made += 1
+        return undo
+
+    def unmake_move(self, board, undo):
+        start = perf_counter()
+        self.backend.unmake_move(board, undo)
+        self.stats.make_time += perf_counter() - start
+
+
+def profiled(kind, function, *args, **kwargs):
+    """
+    Calls function under 'cprofile' or 'tracemalloc', prints the profile and returns the result
+    """
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        result = profiler.runcall(function, *args, **kwargs)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(20)
+        print(out.getvalue())
+        return result
+    if kind == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            result = function(*args, **kwargs)
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        print(f"memory: {current / 1024:.1f} KiB allocated at the end, {peak / 1024:.1f} KiB peak")
+        for stat in snapshot.statistics('lineno')[:15]:
+            print(f"  {stat}")
+        return result
+    raise ValueError(f"unknown profiler {kind!r}")
+
+
+if __name__ == "__main__":
+    import argparse
+    from notation import board_from_fen, START_FEN
+    from runner import SearchContext, iterative_deepening
+    from transposition import TranspositionTable
+
+    parser = argparse.ArgumentParser(description="Search one position and print the search statistics")
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--movetime', type=float, default=None, metavar='SECONDS')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--hash', type=int, default=16, metavar='MB')
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'), help="wrap the search in a profiler")
+    parser.add_argument('--json', metavar='FILE', help="write the statistics to FILE as JSON")
+    args = parser.parse_args()
+
+    board = board_from_fen(args.fen)
+    stats = SearchStats()
+    ctx = SearchContext(tt=TranspositionTable(args.hash) if args.hash > 0 else None, stats=stats)
+    search = (lambda: iterative_deepening(board, board.turn, args.movetime, None, args.depth, ctx))
+    piece, mv, value, depth = profiled(args.profile, search) if args.profile else search()
+    print(f"best move {piece.name} to {mv}, score {value}, depth {depth}")
+    print(stats.report())
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(stats.to_json())
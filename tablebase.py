@@ -0,0 +1,496 @@
+"""
+Endgame tablebases
+
+Distance to win tables for endings with a king and at most one other piece on each side (KK, KQK, KRK, KBK,
+KNK, KPK), built by retrograde analysis under the rules of this engine: only legal moves, a side without legal
+moves is checkmated if its king is attacked and stalemated (a draw) otherwise, and pawns do not promote.
+A table holds one signed byte per position and side to move, counting the plies to the capture of the mated king
+as the search does: n > 0 if the side to move wins in n plies, -n if it loses in n plies (-1 when it is
+checkmated), 0 for a draw. Positions where the side to move could take the king are not legal and hold 0.
+
+The positions are solved backwards from the checkmates: a position is won in n plies when a move leads to
+a position lost in n - 1 plies, and lost in n plies when every move leads to a won position, the longest
+win being n - 1 plies. Captures of other pieces lead into the smaller tables, which are built first.
+
+Table files hold a 16 byte header (magic, number of pieces, material name) and the 2 * 64^pieces values,
+white to move first, indexed by the squares of the pieces in the order of the material name (white first).
+They are memory-mapped when probed. Positions where the stronger side plays black are looked up mirrored.
+
+    python tablebase.py build KQK KRK KPK     # writes tables/KQK.ctb, ... and the smaller tables they need
+    python tablebase.py probe --fen FEN
+"""
+from game import Board, Piece, BLACK, WHITE, EMPTY, MATE, make_move, unmake_move, terminal
+from game import all_available_black_moves, all_available_white_moves
+from movements import KING_TARGETS, KNIGHT_TARGETS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS
+import argparse
+import itertools
+import mmap
+import os
+import random
+import struct
+import time
+
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+HEADER = struct.Struct('>4sB3x8s')
+# Changed from b'CHTB' when the tables moved from king captures to checkmates
+MAGIC = b'CTB2'
+# Piece letters, in the order of the pieces of a material name
+ORDER = 'KQRBNP'
+NAMES = {'K': 'King', 'Q': 'Queen', 'R': 'Rook', 'B': 'Bishop', 'N': 'Knight', 'P': 'Pawn'}
+LETTERS = {name: letter for letter, name in NAMES.items()}
+# A win in n plies scores WIN - n, so shorter wins score higher
+WIN = MATE
+
+# Targets as square numbers (x * 8 + y), from the tables of movements.py
+JUMPS = {'King': [[p.x * 8 + p.y for p in KING_TARGETS[sq // 8][sq % 8]] for sq in range(64)],
+         'Knight': [[p.x * 8 + p.y for p in KNIGHT_TARGETS[sq // 8][sq % 8]] for sq in range(64)]}
+SLIDES = {name: [[[p.x * 8 + p.y for p in ray] for ray in rays[sq // 8][sq % 8]] for sq in range(64)]
+          for name, rays in (('Rook', ROOK_RAYS), ('Bishop', BISHOP_RAYS), ('Queen', QUEEN_RAYS))}
+
+
+def material(name):
+    """
+    Returns the pieces of a material name as (color, name) pairs: 'KQK' is white king, white queen, black king
+    """
+    if not name.startswith('K') or name.count('K') != 2 or any(letter not in NAMES for letter in name):
+        raise ValueError(f"invalid material {name!r}")
+    split = name.index('K', 1)
+    return tuple((WHITE if i < split else BLACK, NAMES[letter]) for i, letter in enumerate(name))
+
+
+def _strength(letters):
+    return -len(letters), [ORDER.index(letter) for letter in letters]
+
+
+def canonical(pieces):
+    """
+    Takes a list of (color, name, square) and returns (material name, squares, mirrored) of the table position:
+    the pieces in material name order, and the board mirrored with the colors swapped if the stronger side is black
+    """
+    sides = {}
+    for color in (WHITE, BLACK):
+        sides[color] = sorted((ORDER.index(LETTERS[name]), sq) for c, name, sq in pieces if c == color)
+    letters = {color: ''.join(ORDER[i] for i, _ in side) for color, side in sides.items()}
+    if _strength(letters[WHITE]) <= _strength(letters[BLACK]):
+        return letters[WHITE] + letters[BLACK], [sq for _, sq in sides[WHITE] + sides[BLACK]], False
+    return (letters[BLACK] + letters[WHITE], [(7 - sq // 8) * 8 + sq % 8 for _, sq in sides[BLACK] + sides[WHITE]], True)
+
+
+def index(squares, turn):
+    i = 0 if turn == WHITE else 1
+    for sq in squares:
+        i = i * 64 + sq
+    return i
+
+
+def _moves(pieces, squares, color):
+    """
+    Yields (piece index, target square, index of the captured piece or None) for every move of color
+    """
+    occupant = {sq: i for i, sq in enumerate(squares)}
+    for i, ((c, name), sq) in enumerate(zip(pieces, squares)):
+        if c != color:
+            continue
+        if name == 'Pawn':
+            # As movements.pawn_rules: black moves down the rows, white up; two steps from the starting row
+            step = 8 if color == BLACK else -8
+            x, y = divmod(sq, 8)
+            if 0 <= x + step // 8 <= 7:
+                one = sq + step
+                if one not in occupant:
+                    yield i, one, None
+                    if x == (1 if color == BLACK else 6) and one + step not in occupant:
+                        yield i, one + step, None
+                for dy in (1, -1):
+                    j = occupant.get(one + dy)
+                    if 0 <= y + dy <= 7 and j is not None and pieces[j][0] != color:
+                        yield i, one + dy, j
+        elif name in JUMPS:
+            for to in JUMPS[name][sq]:
+                j = occupant.get(to)
+                if j is None or pieces[j][0] != color:
+                    yield i, to, j
+        else:
+            for ray in SLIDES[name][sq]:
+                for to in ray:
+                    j = occupant.get(to)
+                    if j is None:
+                        yield i, to, None
+                        continue
+                    if pieces[j][0] != color:
+                        yield i, to, j
+                    break
+
+
+def _in_check(pieces, squares, color):
+    """
+    Returns true if the king of color is attacked, that is the other side has a move capturing it
+    """
+    other = BLACK if color == WHITE else WHITE
+    return any(captured is not None and pieces[captured] == (color, 'King') for _, _, captured in _moves(pieces, squares, other))
+
+
+def _after(pieces, squares, piece, to, captured):
+    """
+    Returns the (color, name, square) pieces after a move
+    """
+    return [(c, n, to if k == piece else sq) for k, ((c, n), sq) in enumerate(zip(pieces, squares)) if k != captured]
+
+
+def _legal_moves(pieces, squares, color):
+    """
+    Yields the moves of _moves which do not leave the king of color attacked
+    """
+    for piece, to, captured in _moves(pieces, squares, color):
+        after = _after(pieces, squares, piece, to, captured)
+        if not _in_check([(c, n) for c, n, _ in after], [sq for _, _, sq in after], color):
+            yield piece, to, captured
+
+
+def _unmoves(pieces, squares, color):
+    """
+    Yields (piece index, square it came from) for every quiet move of color which leads to the squares
+    """
+    occupied = set(squares)
+    for i, ((c, name), sq) in enumerate(zip(pieces, squares)):
+        if c != color:
+            continue
+        if name == 'Pawn':
+            step = 8 if color == BLACK else -8
+            x = sq // 8
+            if 0 <= x - step // 8 <= 7 and sq - step not in occupied:
+                yield i, sq - step
+                if x == (3 if color == BLACK else 4) and sq - 2 * step not in occupied:
+                    yield i, sq - 2 * step
+        elif name in JUMPS:
+            for frm in JUMPS[name][sq]:
+                if frm not in occupied:
+                    yield i, frm
+        else:
+            for ray in SLIDES[name][sq]:
+                for frm in ray:
+                    if frm in occupied:
+                        break
+                    yield i, frm
+
+
+class Table:
+    """
+    Memory-mapped table file
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, pieces, name = HEADER.unpack_from(self.data)
+        if magic != MAGIC or len(self.data) != HEADER.size + 2 * 64 ** pieces:
+            raise ValueError(f"{path} is not a tablebase file of this version, delete it and build the tables again")
+        self.name = name.rstrip(b'\0').decode()
+        self.pieces = material(self.name)
+
+    def value(self, squares, turn):
+        value = self.data[HEADER.size + index(squares, turn)]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        self.data.close()
+
+
+class Tablebases:
+    def __init__(self, directory=TABLE_DIR):
+        """
+        Opens every table file of the directory
+        """
+        self.tables = {}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith('.ctb'):
+                    table = Table(os.path.join(directory, filename))
+                    self.tables[table.name] = table
+        self.max_pieces = max((len(table.pieces) for table in self.tables.values()), default=0)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+
+    def lookup(self, pieces, turn):
+        """
+        Returns the value of the position of the (color, name, square) pieces for the side to move,
+        None if there is no table for its material
+        """
+        name, squares, mirrored = canonical(pieces)
+        table = self.tables.get(name)
+        if table is None:
+            return None
+        if mirrored:
+            turn = BLACK if turn == WHITE else WHITE
+        return table.value(squares, turn)
+
+    def pieces(self, board):
+        """
+        Returns the list of (color, name, square) of a game.Board or bitboard.BitBoard,
+        None if it has more pieces than the largest table
+        """
+        if isinstance(board, Board):
+            if len(board.pieces[WHITE]) + len(board.pieces[BLACK]) > self.max_pieces:
+                return None
+            return [(piece.color, piece.name, piece.pos.x * 8 + piece.pos.y) for color in (WHITE, BLACK) for piece in board.pieces[color]]
+        occupied = board.occupied[WHITE] | board.occupied[BLACK]
+        if bin(occupied).count('1') > self.max_pieces:
+            return None
+        result = []
+        while occupied:
+            sq = (occupied & -occupied).bit_length() - 1
+            occupied &= occupied - 1
+            result.append((*board.squares[sq], sq))
+        return result
+
+    def probe(self, board):
+        """
+        Returns the value of the board for the side to move (plies to the capture of the mated king,
+        negative if it loses, 0 for a draw), None if no table holds the position
+        """
+        pieces = self.pieces(board)
+        if pieces is None:
+            return None
+        return self.lookup(pieces, board.turn)
+
+    def score(self, board):
+        """
+        Returns the search score of the board (positive when white wins), None if no table holds the position
+        """
+        value = self.probe(board)
+        if value is None or value == 0:
+            return value
+        score = WIN - abs(value) if value > 0 else abs(value) - WIN
+        return score if board.turn == WHITE else -score
+
+    def best_move(self, board):
+        """
+        Returns (piece, move, score) of the fastest win, or the slowest loss, for the side to move of a game.Board,
+        None if no table holds the position
+        """
+        if self.probe(board) is None or terminal(board):
+            return None
+        color = board.turn
+        moves = all_available_white_moves(board) if color == WHITE else all_available_black_moves(board)
+        best = None
+        for piece, mvs in moves:
+            for mv in mvs:
+                undo = make_move(board, piece, mv)
+                try:
+                    value = self.probe(board)
+                finally:
+                    unmake_move(board, undo)
+                if value is None:
+                    return None
+                # Plies to the capture of the mated king from the view of the side to move, negative if it loses
+                result = 1 - value if value < 0 else 0 if value == 0 else -(value + 1)
+                # Wins first, the fastest first, then draws, then the slowest loss
+                rank = (0, result) if result > 0 else (1, 0) if result == 0 else (2, result)
+                if best is None or rank < best[0]:
+                    best = (rank, piece, mv, result)
+        if best is None:
+            return None
+        _, piece, mv, result = best
+        score = WIN - result if result > 0 else 0 if result == 0 else -result - WIN
+        return piece, mv, score if color == WHITE else -score
+
+
+def solve(name, tablebases):
+    """
+    Returns the values of every position of the material name as a bytearray, looking the
+    captures up in the smaller tables of tablebases
+    """
+    pieces = material(name)
+    size = 64 ** len(pieces)
+    values = bytearray(2 * size)
+    # Moves of every position not known to lead to a won position, a position is lost when it reaches 0
+    counters = bytearray(2 * size)
+    # Positions where the side to move could take the king, which legal play never reaches
+    illegal = bytearray(2 * size)
+    # Wins and counter decrements from captures into the smaller tables, by the ply they are due
+    capture_wins = {}
+    capture_losses = {}
+    positions = [squares for squares in itertools.product(range(64), repeat=len(pieces)) if len(set(squares)) == len(squares)]
+    for squares in positions:
+        for turn in (WHITE, BLACK):
+            if _in_check(pieces, squares, BLACK if turn == WHITE else WHITE):
+                illegal[index(squares, turn)] = 1
+    lost = []
+    for squares in positions:
+        for turn in (WHITE, BLACK):
+            i = index(squares, turn)
+            if illegal[i]:
+                continue
+            other = BLACK if turn == WHITE else WHITE
+            count = 0
+            for piece, to, captured in _moves(pieces, squares, turn):
+                if captured is None:
+                    if not illegal[index(squares[:piece] + (to,) + squares[piece + 1:], other)]:
+                        count += 1
+                    continue
+                after = _after(pieces, squares, piece, to, captured)
+                if _in_check([(c, n) for c, n, _ in after], [sq for _, _, sq in after], turn):
+                    continue
+                value = tablebases.lookup(after, other)
+                if value < 0:
+                    capture_wins.setdefault(1 - value, []).append(i)
+                elif value > 0:
+                    capture_losses.setdefault(value + 1, []).append(i)
+                count += 1
+            counters[i] = min(count, 255)
+            if count == 0 and illegal[index(squares, other)]:
+                # Checkmate: the king is lost on the next ply. Without a move and not in check it is stalemate, a draw.
+                values[i] = 255
+                lost.append(i)
+
+    def predecessors(states):
+        for i in states:
+            turn, rest = divmod(i, size)
+            squares = []
+            for _ in pieces:
+                rest, sq = divmod(rest, 64)
+                squares.append(sq)
+            squares.reverse()
+            moved = WHITE if turn else BLACK
+            for piece, frm in _unmoves(pieces, squares, moved):
+                yield index(squares[:piece] + [frm] + squares[piece + 1:], moved)
+
+    won = []
+    ply = 1
+    while won or lost or any(p > ply for p in capture_wins) or any(p > ply for p in capture_losses):
+        ply += 1
+        if ply > 127:
+            raise ValueError(f"{name}: distances do not fit in a byte")
+        new_won = []
+        for i in itertools.chain(capture_wins.pop(ply, ()), predecessors(lost)):
+            if values[i] == 0 and not illegal[i]:
+                values[i] = ply
+                new_won.append(i)
+        new_lost = []
+        for i in itertools.chain(capture_losses.pop(ply, ()), predecessors(won)):
+            if values[i] == 0 and not illegal[i]:
+                counters[i] -= 1
+                if counters[i] == 0:
+                    values[i] = 256 - ply
+                    new_lost.append(i)
+        won, lost = new_won, new_lost
+    return values
+
+
+def verify(name, tablebases, samples, rng):
+    """
+    Checks random legal positions of a built table against the values of their moves, and the moves
+    against the move generation of game.py. Returns the number of mismatches.
+    """
+    table = tablebases.tables[name]
+    pieces = material(name)
+    errors = 0
+    for _ in range(samples):
+        squares = rng.sample(range(64), len(pieces))
+        turn = rng.choice((WHITE, BLACK))
+        if _in_check(pieces, squares, BLACK if turn == WHITE else WHITE):
+            continue
+        rows = [[EMPTY] * 8 for _ in range(8)]
+        for k, ((color, piece_name), sq) in enumerate(zip(pieces, squares)):
+            piece = Piece(piece_name if piece_name in ('King', 'Queen') else f"{piece_name}-{k}", divmod(sq, 8), color)
+            piece.init = piece_name != 'Pawn' or sq // 8 != (1 if color == BLACK else 6)
+            rows[sq // 8][sq % 8] = piece
+        board = Board(rows, turn)
+        generated = all_available_white_moves(board) if turn == WHITE else all_available_black_moves(board)
+        expected = sorted((p.pos.x * 8 + p.pos.y, mv.x * 8 + mv.y) for p, mvs in generated for mv in mvs)
+        if sorted((squares[piece], to) for piece, to, _ in _legal_moves(pieces, squares, turn)) != expected:
+            errors += 1
+            continue
+        best = tablebases.best_move(board)
+        value = table.value(squares, turn)
+        if best is None:
+            # No legal move: checkmate or stalemate
+            if value != (-1 if _in_check(pieces, squares, turn) else 0):
+                errors += 1
+            continue
+        score = best[2] if turn == WHITE else -best[2]
+        if value != (0 if score == 0 else WIN - score if score > 0 else -(WIN + score)):
+            errors += 1
+    return errors
+
+
+def needed(name):
+    """
+    Returns the material names of the tables the captures of name lead into, smallest first
+    """
+    pieces = material(name)
+    result = []
+    for k, (color, piece_name) in enumerate(pieces):
+        if piece_name == 'King':
+            continue
+        smaller = canonical([(c, n, 0) for j, (c, n) in enumerate(pieces) if j != k])[0]
+        for table in needed(smaller) + [smaller]:
+            if table not in result:
+                result.append(table)
+    return result
+
+
+def build(names, directory=TABLE_DIR, samples=2000):
+    """
+    Builds the tables of the material names and the smaller tables they need, skipping existing files
+    """
+    os.makedirs(directory, exist_ok=True)
+    order = []
+    for name in names:
+        for table in needed(name) + [name]:
+            if table not in order:
+                order.append(table)
+    for name in order:
+        path = os.path.join(directory, f"{name}.ctb")
+        if os.path.exists(path):
+            continue
+        tablebases = Tablebases(directory)
+        start = time.perf_counter()
+        values = solve(name, tablebases)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(name), name.encode()))
+            f.write(values)
+        tablebases.close()
+        tablebases = Tablebases(directory)
+        errors = verify(name, tablebases, samples, random.Random(0))
+        tablebases.close()
+        wins = sum(1 for value in values if 0 < value < 128)
+        longest = max((value for value in values if value < 128), default=0)
+        print(f"{name}: {len(values)} positions, {wins} won for the side to move, longest win {longest} plies, "
+              f"{time.perf_counter() - start:.1f}s, {errors} mismatches in {samples} checked positions")
+
+
+def main():
+    from notation import board_from_fen, square_name
+
+    parser = argparse.ArgumentParser(description="Build or probe the endgame tablebases")
+    parser.add_argument('--dir', default=TABLE_DIR, help="directory of the table files")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="build tables and the smaller tables they need")
+    build_parser.add_argument('materials', nargs='+', help="material names like KQK, white pieces first")
+    build_parser.add_argument('--verify', type=int, default=2000, metavar='N', help="random positions checked after building")
+    probe_parser = commands.add_parser('probe', help="print the value and best move of a position")
+    probe_parser.add_argument('--fen', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.materials, args.dir, args.verify)
+        return
+    board = board_from_fen(args.fen)
+    tablebases = Tablebases(args.dir)
+    value = tablebases.probe(board)
+    if value is None:
+        print("No table for this position")
+        return
+    best = tablebases.best_move(board)
+    result = 'draw' if value == 0 else f"{'win' if value > 0 else 'loss'} in {abs(value)} plies"
+    if best is None:
+        print(result)
+    else:
+        piece, mv, _ = best
+        print(f"{result}, best move {square_name(piece.pos.x, piece.pos.y)}{square_name(mv.x, mv.y)}")
+
+
+if __name__ == "__main__":
+    main()
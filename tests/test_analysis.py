@@ -0,0 +1,30 @@
+import random
+
+from analysis import AnalysisCache
+from game import WHITE, game_init, all_available_white_moves
+
+
+def test_cache_stays_bounded_across_runs(tmp_path):
+    path = str(tmp_path / 'analysis.db')
+    board = game_init(WHITE)[0]
+    piece, mv = [(piece, mv) for piece, mvs in all_available_white_moves(board) for mv in mvs][0]
+    rng = random.Random(1)
+    for _ in range(5):
+        with AnalysisCache(path, max_entries=20) as cache:
+            for _ in range(30):
+                board.key = rng.getrandbits(64)
+                cache.store(board, piece, mv, 0, 3, 0.1)
+            assert len(cache) <= 20
+    with AnalysisCache(path, max_entries=20) as cache:
+        assert len(cache) == 20
+        assert len(cache) == cache.db.execute('SELECT COUNT(*) FROM analysis').fetchone()[0]
+
+
+def test_deeper_result_replaces_entry_without_counting_twice(tmp_path):
+    board = game_init(WHITE)[0]
+    piece, mv = [(piece, mv) for piece, mvs in all_available_white_moves(board) for mv in mvs][0]
+    with AnalysisCache(str(tmp_path / 'analysis.db')) as cache:
+        cache.store(board, piece, mv, 5, 3, 0.1)
+        cache.store(board, piece, mv, 7, 4, 0.2)
+        assert len(cache) == 1
+        assert cache.lookup(board, 4)[2] == 7
@@ -0,0 +1,89 @@
+"""
+Transposition table for the alpha-beta search
+"""
+
+# Bound types of a stored score
+EXACT = 0
+LOWER = 1  # The score is at least this value (the search failed high)
+UPPER = 2  # The score is at most this value (the search failed low)
+
+# Approximate size of one entry in bytes: the slot in the list, the entry tuple and its integers
+ENTRY_SIZE = 168
+
+
+def bound(score, alpha, beta):
+    """
+    Returns the bound type of a score searched with the (alpha, beta) window
+    """
+    if score <= alpha:
+        return UPPER
+    if score >= beta:
+        return LOWER
+    return EXACT
+
+
+class TranspositionTable:
+    def __init__(self, megabytes=16):
+        """
+        megabytes: memory the table may use, which fixes the number of entries
+        Entries are (key, depth, score, bound, move id, age) tuples, at most one per slot.
+        """
+        self.size = max(1, megabytes * 1024 * 1024 // ENTRY_SIZE)
+        self.entries = [None] * self.size
+        # Incremented for every new search, so entries of older searches get replaced first
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.rejected = 0
+
+    def new_search(self):
+        self.age += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    def probe(self, key):
+        """
+        Returns the entry stored for the key, None if there is none
+        """
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is None:
+            return None
+        if entry[0] != key:
+            # The slot holds another position
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, flag, move):
+        """
+        Stores the result of a search of the position with the key.
+        A slot holding another position of the current search which was searched deeper is kept.
+        """
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is not None and entry[0] != key and entry[5] == self.age and entry[1] > depth:
+            self.rejected += 1
+            return
+        self.stores += 1
+        self.entries[index] = (key, depth, score, flag, move, self.age)
+
+    def used(self):
+        """
+        Returns the number of slots holding an entry
+        """
+        return self.size - self.entries.count(None)
+
+    def report(self):
+        """
+        Returns the hit, miss and collision rates as a printable string
+        """
+        probes = max(self.probes, 1)
+        misses = self.probes - self.hits
+        return (f"TT: {self.probes} probes, hits {100 * self.hits / probes:.1f}%, "
+                f"misses {100 * misses / probes:.1f}%, collisions {100 * self.collisions / probes:.1f}%, "
+                f"{self.stores} stores, {self.rejected} rejected, {100 * self.used() / self.size:.1f}% full")
@@ -0,0 +1,222 @@
+"""
+UCI protocol engine
+
+Speaks the Universal Chess Interface on stdin/stdout, so the engine can be used from chess GUIs and tournament
+managers. Commands are read on the main thread while a search runs on a background thread, so stop (or quit)
+ends a running search at once through the stop event of its search context.
+
+Supported: uci, debug, isready, setoption (Hash), ucinewgame, position [startpos | fen FEN] [moves ...],
+go [wtime btime winc binc movestogo movetime depth nodes infinite], stop, quit.
+Moves are written like 'e2e4'. The engine has no castling, en passant or promotion, so such moves are rejected.
+
+    python uci.py --hash 64
+"""
+from game import WHITE, MATE, move, all_available_black_moves, all_available_white_moves
+from notation import board_from_fen, parse_square, square_name, START_FEN
+from point import Point
+from runner import SearchContext, MATE_BOUND, iterative_deepening
+from transposition import TranspositionTable
+import argparse
+import sys
+import threading
+
+# Share of the remaining clock used for one move when the number of moves to the time control is unknown
+MOVES_TO_GO = 30
+# Seconds kept back from every move for the communication with the GUI
+MOVE_OVERHEAD = 0.05
+
+
+def move_name(piece, mv):
+    return square_name(piece.pos.x, piece.pos.y) + square_name(mv.x, mv.y)
+
+
+def parse_move(board, text):
+    """
+    Returns (piece, Point) of a move written like 'e2e4' for the side to move, raising ValueError if it is not a move
+    """
+    if len(text) != 4:
+        raise ValueError(f"unsupported move {text!r}")
+    (x, y), to = parse_square(text[:2]), Point(*parse_square(text[2:]))
+    moves = all_available_white_moves(board) if board.turn == WHITE else all_available_black_moves(board)
+    for piece, mvs in moves:
+        if piece.pos.x == x and piece.pos.y == y and to in mvs:
+            return piece, to
+    raise ValueError(f"illegal move {text!r}")
+
+
+def uci_score(value, color):
+    """
+    Returns the UCI score of a search score for the side to move: 'mate n' in moves for a mate
+    (negative when getting mated), otherwise 'cp n' in centipawns, where the search has 10 points per pawn
+    """
+    value = value if color == WHITE else -value
+    if abs(value) >= MATE_BOUND:
+        # Mate scores count the plies to the capture of the mated king
+        plies = MATE - abs(value) - 1
+        return f"mate {(plies + 1) // 2 if value > 0 else -(plies // 2)}"
+    return f"cp {value * 10}"
+
+
+def time_budget(board, options):
+    """
+    Returns the seconds to spend on the move from the go options, None for no limit
+    """
+    if 'movetime' in options:
+        return max(options['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+    left, increment = ('wtime', 'winc') if board.turn == WHITE else ('btime', 'binc')
+    if left not in options:
+        return None
+    left = options[left] / 1000
+    increment = options.get(increment, 0) / 1000
+    moves_to_go = options.get('movestogo', MOVES_TO_GO)
+    budget = left / max(moves_to_go, 1) + increment * 0.8
+    # Never plan to use more than half of what is left
+    return max(min(budget, left / 2) - MOVE_OVERHEAD, 0.01)
+
+
+class UCIEngine:
+    def __init__(self, hash_mb=16, output=sys.stdout, **options):
+        """
+        hash_mb: transposition table size in megabytes, 0 for none
+        options: other SearchContext options of the searches
+        """
+        self.output = output
+        self.options = options
+        self.hash_mb = hash_mb
+        self.tt = TranspositionTable(hash_mb) if hash_mb > 0 else None
+        self.board = board_from_fen(START_FEN)
+        self.thread = None
+        self.ctx = None
+        self.debug = False
+
+    def send(self, text):
+        print(text, file=self.output, flush=True)
+
+    def handle(self, line):
+        """
+        Executes one command line. Returns False after quit.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == 'uci':
+            self.send("id name Chess-AI")
+            self.send("id author Chess-AI developers")
+            self.send(f"option name Hash type spin default {self.hash_mb} min 0 max 4096")
+            self.send("uciok")
+        elif command == 'debug':
+            self.debug = args[:1] == ['on']
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            if self.tt is not None:
+                self.tt.clear()
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            return False
+        elif self.debug:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        text = ' '.join(args)
+        if 'name' not in args or 'value' not in args:
+            return
+        name = text[text.index('name') + 5:text.index(' value')].strip()
+        value = args[args.index('value') + 1]
+        if name.lower() == 'hash' and value.isdigit():
+            self.stop()
+            self.hash_mb = int(value)
+            self.tt = TranspositionTable(self.hash_mb) if self.hash_mb > 0 else None
+
+    def set_position(self, args):
+        if 'moves' in args:
+            split = args.index('moves')
+            args, moves = args[:split], args[split + 1:]
+        else:
+            moves = []
+        try:
+            board = board_from_fen(' '.join(args[1:]) if args[:1] == ['fen'] else START_FEN)
+        except ValueError as e:
+            self.send(f"info string {e}")
+            return
+        for text in moves:
+            try:
+                piece, mv = parse_move(board, text)
+            except ValueError as e:
+                self.send(f"info string {e}, ignoring the moves from there")
+                break
+            move(board, piece, mv)
+        self.board = board
+
+    def go(self, args):
+        options = {}
+        infinite = False
+        i = 0
+        while i < len(args):
+            if args[i] == 'infinite':
+                infinite = True
+            elif args[i] in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes') and i + 1 < len(args):
+                try:
+                    options[args[i]] = int(args[i + 1])
+                except ValueError:
+                    self.send(f"info string invalid {args[i]} {args[i + 1]!r}, ignoring it")
+                i += 1
+            i += 1
+        movetime = None if infinite else time_budget(self.board, options)
+        if self.tt is not None:
+            self.tt.new_search()
+        self.ctx = SearchContext(tt=self.tt, stop=threading.Event(), **self.options)
+        self.thread = threading.Thread(target=self.search, daemon=True,
+                                       args=(self.board, movetime, options.get('nodes'), options.get('depth', 64), infinite))
+        self.thread.start()
+
+    def search(self, board, movetime, max_nodes, max_depth, infinite=False):
+        """
+        Searches the board and sends the best move. After 'go infinite' the best move is only sent once
+        the search is stopped, even if it ended earlier (at a depth limit or a mate).
+        """
+        def info(depth, piece, mv, value, nodes, seconds):
+            self.send(f"info depth {depth} score {uci_score(value, board.turn)} nodes {nodes} "
+                      f"nps {int(nodes / max(seconds, 1e-6))} time {int(seconds * 1000)} pv {move_name(piece, mv)}")
+
+        piece, mv, _, _ = iterative_deepening(board, board.turn, movetime, max_nodes, max_depth, self.ctx, info)
+        if infinite:
+            self.ctx.stop.wait()
+        self.send(f"bestmove {move_name(piece, mv) if piece is not None else '0000'}")
+
+    def stop(self):
+        """
+        Stops the running search, if any, and waits for its bestmove
+        """
+        if self.thread is not None:
+            self.ctx.stop.set()
+            self.thread.join()
+            self.thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the engine as a UCI engine on stdin/stdout")
+    parser.add_argument('--hash', type=int, default=16, metavar='MB', help="transposition table size in megabytes (0 disables it)")
+    args = parser.parse_args()
+    engine = UCIEngine(args.hash)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stop()
+
+
+if __name__ == "__main__":
+    main()